@@ -0,0 +1,88 @@
+"""Writes to `.data` per submitted score, every change writing the files
+like `update_files` used to against the debounced flush
+
+run from the repo root with `python -m bench.debounced_flush`
+"""
+import utils
+import asyncio
+import tempfile
+from ext import glob
+from pathlib import Path
+from typing import Callable
+from objects.writer import Writer
+from objects.jsonfile import JsonFile
+from objects.storage import JsonStorage
+from bench.jsonfile_wal import NAME
+from bench.jsonfile_wal import play
+
+SUBMITS = 50
+
+def count_writes(file: JsonFile) -> list[int]:
+    writes = [0]
+    update_file = file.update_file
+    def counted() -> None:
+        writes[0] += file.dirty
+        update_file()
+
+    file.update_file = counted # type: ignore
+    return writes
+
+def write_all() -> None:
+    for file in (
+        glob.pfps, glob.beatmaps,
+        glob.profiles, glob.modified_beatmaps
+    ):
+        file.update_file()
+
+async def submit(idx: int, changed: Callable, flush: Callable) -> None:
+    # `score_sub` bumping the playcount
+    glob.profiles.set((NAME, 'playcount'), idx)
+    changed()
+
+    # `Beatmap.add_to_db` then the score itself
+    score = play(idx)
+    glob.beatmaps[score['md5']] = {'md5': score['md5']}
+    changed()
+    glob.storage.add(NAME, score, 'ranked')
+    flush()
+
+async def main() -> None:
+    glob.writer = Writer()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, changed, flush in (
+            ('every change', write_all, write_all),
+            ('debounced', utils.files_changed, utils.flush_files)
+        ):
+            for file in ('pfps', 'beatmaps', 'profiles', 'modified_beatmaps'):
+                path = Path(tmp) / name / f'{file}.json'
+                path.parent.mkdir(exist_ok = True)
+                setattr(glob, file, JsonFile(path, writer = glob.writer))
+
+            glob.profiles.update({NAME: {
+                'playcount': 0, 'plays': {
+                    'ranked_plays': {}, 'loved_plays': {},
+                    'qualified_plays': {}, 'approved_plays': {},
+                    'all_plays': [], 'replay_md5': []
+                }
+            }})
+            glob.storage = JsonStorage()
+            glob.flush_timer = None
+            write_all()
+
+            writes = [
+                count_writes(glob.profiles),
+                count_writes(glob.beatmaps)
+            ]
+            for idx in range(SUBMITS):
+                await submit(idx, changed, flush)
+
+            print(
+                f'{name:>12}: {writes[0][0] / SUBMITS:.1f} profiles.json and '
+                f'{writes[1][0] / SUBMITS:.1f} beatmaps.json writes/score'
+            )
+
+        # before the directory goes away
+        glob.writer.close()
+
+if __name__ == '__main__':
+    asyncio.run(main())
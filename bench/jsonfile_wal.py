@@ -0,0 +1,88 @@
+"""Write amplification of saving a score to a profile with 10k plays,
+rewriting the whole file like `JsonFile` used to against appending
+the change to its log
+
+run from the repo root with `python -m bench.jsonfile_wal`
+"""
+import time
+import orjson
+import tempfile
+from pathlib import Path
+from objects.jsonfile import JsonFile
+
+PLAYS = 10_000
+SUBMITS = 200
+NAME = 'cover'
+
+def play(idx: int) -> dict:
+    return {
+        'mode': 0, 'md5': f'{idx % 2500:032x}', 'name': NAME,
+        'n300': 1200, 'n100': 34, 'n50': 2, 'ngeki': 250, 'nkatu': 20,
+        'nmiss': 1, 'score': 12_345_678, 'max_combo': 1500, 'perfect': False,
+        'mods': 72, 'additional_mods': 0, 'acc': 98.12, 'pp': 321.5,
+        'replay_md5': f'{idx:032x}', 'time': 1_600_000_000 + idx,
+        'scoreid': idx + 1, 'replay_frames': 'A' * 512, 'mods_str': 'HDDT'
+    }
+
+def profile() -> dict:
+    plays = [play(i) for i in range(PLAYS)]
+    ranked: dict[str, list[dict]] = {}
+    for p in plays:
+        ranked.setdefault(p['md5'], []).append(p)
+
+    return {NAME: {
+        'pp': 0, 'acc': 0, 'playcount': PLAYS,
+        'plays': {
+            'ranked_plays': ranked, 'loved_plays': {},
+            'qualified_plays': {}, 'approved_plays': {},
+            'all_plays': plays,
+            'replay_md5': [p['replay_md5'] for p in plays]
+        }
+    }}
+
+def submit(profiles: JsonFile, idx: int) -> None:
+    score = play(idx)
+    profiles.append((NAME, 'plays', 'all_plays'), score)
+    profiles.append((NAME, 'plays', 'ranked_plays', score['md5']), score)
+    profiles.append((NAME, 'plays', 'replay_md5'), score['replay_md5'])
+    profiles.set((NAME, 'playcount'), idx + 1)
+
+def rewrite(profiles: JsonFile) -> int:
+    data = orjson.dumps(dict(profiles))
+    profiles.path.write_bytes(data)
+    profiles.pending.clear()
+    return len(data)
+
+def wal(profiles: JsonFile) -> int:
+    before = profiles.log_size
+    profiles.update_file()
+    # bytes appended, or the whole snapshot when it compacted
+    if profiles.log_size < before:
+        return profiles.path.stat().st_size
+
+    return profiles.log_size - before
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'profiles.json'
+        path.write_bytes(orjson.dumps(profile()))
+        size = path.stat().st_size
+
+        for name, save in (('rewrite', rewrite), ('append log', wal)):
+            profiles = JsonFile(path)
+            written = 0
+            start = time.perf_counter()
+            for idx in range(PLAYS, PLAYS + SUBMITS):
+                submit(profiles, idx)
+                written += save(profiles)
+
+            elapsed = (time.perf_counter() - start) / SUBMITS
+            print(
+                f'{name:>10}: {written / SUBMITS:12.0f}B written/score '
+                f'({written / SUBMITS / size:8.5f}x the {size}B file), '
+                f'{elapsed * 1000:6.2f}ms/score'
+            )
+            profiles.compact()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""How long the event loop stalls while scores are saved to a profiles.json
+holding replays, writing on the loop like `JsonFile` used to against
+handing the writes to a `Writer` thread
+
+run from the repo root with `python -m bench.offloop_writes`
+"""
+import time
+import orjson
+import asyncio
+import tempfile
+from pathlib import Path
+from typing import Optional
+from objects.writer import Writer
+from objects.jsonfile import JsonFile
+from bench.jsonfile_wal import NAME
+from bench.jsonfile_wal import play
+
+PLAYS = 2000
+SUBMITS = 100
+# base64 replay frames are around this big
+REPLAY_SIZE = 20_000
+# small enough that the snapshot gets rewritten a few times
+COMPACT_SIZE = 512 * 1024
+
+def profile() -> dict:
+    plays = [
+        play(idx) | {'replay_frames': 'A' * REPLAY_SIZE}
+        for idx in range(PLAYS)
+    ]
+    return {NAME: {'playcount': PLAYS, 'plays': {'all_plays': plays}}}
+
+async def lag(stalls: list[float]) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - start - 0.001)
+
+async def run(path: Path, writer: Optional[Writer]) -> None:
+    profiles = JsonFile(path, compact_size = COMPACT_SIZE, writer = writer)
+    stalls: list[float] = []
+    ticker = asyncio.create_task(lag(stalls))
+
+    for idx in range(PLAYS, PLAYS + SUBMITS):
+        score = play(idx) | {'replay_frames': 'A' * REPLAY_SIZE}
+        profiles.append((NAME, 'plays', 'all_plays'), score)
+        profiles.update_file()
+        await asyncio.sleep(0.005)
+
+    if writer:
+        await asyncio.wrap_future(writer.sync())
+
+    ticker.cancel()
+    stalls.sort()
+    print(
+        f"{'writer thread' if writer else 'on the loop':>13}: "
+        f'worst stall {stalls[-1] * 1000:7.2f}ms, '
+        f'p99 {stalls[int(len(stalls) * 0.99)] * 1000:6.2f}ms'
+        + (
+            f', {writer.blocked_time * 1000:.0f}ms on the loop '
+            f'and {writer.write_time * 1000:.0f}ms writing on the thread'
+            if writer else ''
+        )
+    )
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        data = orjson.dumps(profile())
+        for writer in (None, Writer()):
+            path = Path(tmp) / 'profiles.json'
+            path.write_bytes(data)
+            asyncio.run(run(path, writer))
+            if writer:
+                writer.close()
+
+if __name__ == '__main__':
+    main()
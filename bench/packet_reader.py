@@ -0,0 +1,148 @@
+"""Bancho `/c/` bodies read the way `objects/replay.py` reads replays,
+slicing the remaining data on every field, against `packets.PacketReader`
+
+the streams are what an idle, a playing and a chatting client
+send per poll, built with `packets.write`
+
+run from the repo root with `python -m bench.packet_reader`
+"""
+import time
+import struct
+import packets
+from packets import PacketIDS
+
+ROUNDS = 20_000
+
+def change_action(action: int, text: str, md5: str) -> bytes:
+    return packets.write(
+        PacketIDS.OSU_CHANGE_ACTION,
+        (action, 'unbyte'), (text, 'str'), (md5, 'str'),
+        (72, 'unint'), (0, 'unbyte'), (1816113, 'int')
+    )
+
+def public_message(msg: str) -> bytes:
+    return packets.write(
+        PacketIDS.OSU_SEND_PUBLIC_MESSAGE,
+        ('', 'str'), (msg, 'str'), ('#osu', 'str'), (0, 'int')
+    )
+
+STREAMS = {
+    'idle': packets.write(PacketIDS.OSU_PING),
+    'playing': (
+        change_action(2, 'xi - FREEDOM DiVE [FOUR DIMENSIONS]', 'a' * 32) +
+        packets.write(PacketIDS.OSU_USER_STATS_REQUEST, ((2, 3, 4), 'list_32')) +
+        packets.write(PacketIDS.OSU_PING)
+    ),
+    'chatting': b''.join(public_message(f'message {i} ' * 8) for i in range(8))
+}
+
+class SlicingReader:
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+        self.offset = 0
+
+    @property
+    def data(self) -> bytes:
+        return self._data[self.offset:]
+
+    def read_byte(self) -> int:
+        val, = struct.unpack('<b', self.data[:1])
+        self.offset += 1
+        return val
+
+    def read_unsigned_byte(self) -> int:
+        val, = struct.unpack('<B', self.data[:1])
+        self.offset += 1
+        return val
+
+    def read_short(self) -> int:
+        val, = struct.unpack('<h', self.data[:2])
+        self.offset += 2
+        return val
+
+    def read_int(self) -> int:
+        val, = struct.unpack('<i', self.data[:4])
+        self.offset += 4
+        return val
+
+    def read_unsigned_int(self) -> int:
+        val, = struct.unpack('<I', self.data[:4])
+        self.offset += 4
+        return val
+
+    def read_uleb128(self) -> int:
+        val = shift = 0
+
+        while True:
+            b = self.data[0]
+            self.offset += 1
+
+            val |= ((b & 0b01111111) << shift)
+            if (b & 0b10000000) == 0:
+                break
+
+            shift += 7
+
+        return val
+
+    def read_string(self) -> str:
+        if self.read_byte() == 0x0b:
+            length = self.read_uleb128()
+            val = self.data[:length]
+            self.offset += length
+            return val.decode()
+
+        return ''
+
+    def read_list32(self) -> list[int]:
+        return [self.read_int() for _ in range(self.read_short())]
+
+    def __iter__(self):
+        while len(self.data) >= 7:
+            packetid = self.read_short()
+            self.offset += 1
+            length = self.read_unsigned_int()
+            end = self.offset + length
+            yield packetid, length
+            self.offset = end
+
+def read_packets(reader) -> int:
+    fields = 0
+    for packetid, _ in reader:
+        if packetid == PacketIDS.OSU_CHANGE_ACTION:
+            reader.read_unsigned_byte(); reader.read_string()
+            reader.read_string(); reader.read_unsigned_int()
+            reader.read_unsigned_byte(); reader.read_int()
+            fields += 6
+        elif packetid == PacketIDS.OSU_SEND_PUBLIC_MESSAGE:
+            reader.read_string(); reader.read_string()
+            reader.read_string(); reader.read_int()
+            fields += 4
+        elif packetid == PacketIDS.OSU_USER_STATS_REQUEST:
+            fields += len(reader.read_list32())
+
+    return fields
+
+def bench(reader_cls, data: bytes) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        read_packets(reader_cls(data))
+
+    return ROUNDS / (time.perf_counter() - start)
+
+def main() -> None:
+    for name, data in STREAMS.items():
+        assert (
+            read_packets(SlicingReader(data)) ==
+            read_packets(packets.PacketReader(data))
+        )
+
+        slicing = bench(SlicingReader, data)
+        view = bench(packets.PacketReader, data)
+        print(
+            f'{name:>8} ({len(data):4}B): slicing {slicing:9.0f} bodies/s, '
+            f'memoryview {view:9.0f} bodies/s ({view / slicing:.2f}x)'
+        )
+
+if __name__ == '__main__':
+    main()
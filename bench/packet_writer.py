@@ -0,0 +1,107 @@
+"""Packets/sec of the original tag walking `packets.write` against
+the precompiled `packets.Packet` schemas the builders use now
+
+run from the repo root with `python -m bench.packet_writer`
+"""
+import time
+import struct
+import packets
+from packets import PacketIDS
+
+ROUNDS = 100_000
+
+# the writer this repo started with, kept as it was
+def write_uleb128(num: int) -> bytes:
+    if num == 0:
+        return bytearray(b'\x00')
+
+    ret = bytearray()
+    length = 0
+
+    while num > 0:
+        ret.append(num & 0b01111111)
+        num >>= 7
+        if num != 0:
+            ret[length] |= 0b10000000
+        length += 1
+
+    return bytes(ret)
+
+def write_string(string: str) -> bytes:
+    s = string.encode()
+    return b'\x0b' + write_uleb128(len(s)) + s
+
+def write_list32(l: tuple[int]) -> bytes:
+    ret = bytearray(struct.pack('<h', len(l)))
+
+    for item in l:
+        ret += struct.pack('<i', item)
+
+    return bytes(ret)
+
+def legacy_write(packetid: int, *args) -> bytes:
+    p = bytearray(struct.pack('<Hx', packetid))
+
+    for ctx, _type in args:
+        if _type == 'str':
+            p += write_string(ctx)
+        elif _type == 'int':
+            p += struct.pack('<i', ctx)
+        elif _type == 'unint':
+            p += struct.pack('<I', ctx)
+        elif _type == 'short':
+            p += struct.pack('<h', ctx)
+        elif _type == 'float':
+            p += struct.pack('<f', ctx)
+        elif _type == 'long':
+            p += struct.pack('<q', ctx)
+        elif _type == 'byte':
+            p += struct.pack('<b', ctx)
+        elif _type == 'unbyte':
+            p += struct.pack('<B', ctx)
+        elif _type == 'list_32':
+            p += write_list32(ctx)
+        else:
+            p += struct.pack(f'<{_type}', ctx)
+
+    p[3:3] = struct.pack('<I', len(p) - 3)
+    return bytes(p)
+
+STATS = (
+    2, 2, 'xi - FREEDOM DiVE [FOUR DIMENSIONS]', 'a' * 32, 72, 0, 1816113,
+    12_345_678_901, 0.9876, 1234, 98_765_432_109, 42, 9000
+)
+STATS_TYPES = (
+    'int', 'byte', 'str', 'str', 'int', 'unbyte', 'int',
+    'long', 'float', 'int', 'long', 'int', 'short'
+)
+MESSAGE = ('local', '[http://127.0.0.1:5000/api/v1/client/tops?limit=100 view tops]', '#osu', -1)
+MESSAGE_TYPES = ('str', 'str', 'str', 'int')
+
+CASES = {
+    'userStats': (PacketIDS.CHO_USER_STATS, STATS, STATS_TYPES, packets.USER_STATS),
+    'sendMsg': (PacketIDS.CHO_SEND_MESSAGE, MESSAGE, MESSAGE_TYPES, packets.SEND_MESSAGE),
+    'friendsList': (PacketIDS.CHO_FRIENDS_LIST, ((2, 3, 4, 5),), ('list_32',), packets.FRIENDS_LIST)
+}
+
+def bench(func) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func()
+
+    return ROUNDS / (time.perf_counter() - start)
+
+def main() -> None:
+    for name, (packetid, values, types, schema) in CASES.items():
+        args = tuple(zip(values, types))
+        assert legacy_write(packetid, *args) == schema(*values)
+
+        legacy = bench(lambda: legacy_write(packetid, *args))
+        compiled = bench(lambda: schema(*values))
+        print(
+            f'{name:>12}: write {legacy:9.0f} packets/s, '
+            f'schema {compiled:9.0f} packets/s ({compiled / legacy:.2f}x)'
+        )
+
+if __name__ == '__main__':
+    main()
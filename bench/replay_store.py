@@ -0,0 +1,71 @@
+"""Size of a profiles.json with 2000 plays and how long rewriting its
+snapshot holds the event loop, with the replay frames embedded as
+base64 against moved out into `.data/replays`
+
+run from the repo root with `python -m bench.replay_store`
+"""
+import os
+import time
+import utils
+import orjson
+import tempfile
+from pathlib import Path
+from objects.writer import Writer
+from objects.jsonfile import JsonFile
+from objects.replays import ReplayStore
+from bench.jsonfile_wal import NAME
+from bench.jsonfile_wal import play
+
+PLAYS = 2000
+# compressed frames of a few minutes long play
+REPLAY_SIZE = 15_000
+RUNS = 5
+
+def profile() -> dict:
+    plays = []
+    for idx in range(PLAYS):
+        frames = os.urandom(REPLAY_SIZE)
+        plays.append(play(idx) | {
+            'replay_frames': utils.bytes_to_string(frames)
+        })
+
+    ranked: dict[str, list[dict]] = {}
+    for p in plays:
+        ranked.setdefault(p['md5'], []).append(p)
+
+    return {NAME: {'playcount': PLAYS, 'plays': {
+        'ranked_plays': ranked, 'loved_plays': {},
+        'qualified_plays': {}, 'approved_plays': {},
+        'all_plays': plays,
+        'replay_md5': [p['replay_md5'] for p in plays]
+    }}}
+
+def snapshot(profiles: JsonFile) -> float:
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        orjson.dumps(profiles.data)
+
+    return (time.perf_counter() - start) / RUNS
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'profiles.json'
+        path.write_bytes(orjson.dumps(profile()))
+
+        writer = Writer()
+        profiles = JsonFile(path, writer = writer)
+        size, serialize = path.stat().st_size, snapshot(profiles)
+
+        replays = ReplayStore(Path(tmp) / 'replays', writer)
+        replays.migrate(profiles)
+        writer.close()
+
+        moved_size, moved_serialize = path.stat().st_size, snapshot(profiles)
+        print(
+            f'  embedded: {size:>11}B, {serialize * 1000:7.2f}ms to serialize\n'
+            f' moved out: {moved_size:>11}B, {moved_serialize * 1000:7.2f}ms '
+            f'to serialize ({size / moved_size:.0f}x smaller)'
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Per-request allocations and peak memory of request parsing under
+bancho polls, the original dict backed `Request` against the slotted one
+
+run from the repo root with `python -m bench.request_alloc`
+"""
+import sys
+import gc
+import tracemalloc
+from typing import Any
+from server import Server
+from server import RequestParser
+
+POLLS = 10_000
+POLL = (
+    b'POST /c/ HTTP/1.1\r\n'
+    b'osu-token: 0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0\r\n'
+    b'User-Agent: osu!\r\n'
+    b'Accept-Encoding: gzip, deflate\r\n'
+    b'Content-Length: 7\r\n'
+    b'Host: c.ppy.sh\r\n'
+    b'Connection: Keep-Alive\r\n'
+    b'\r\n'
+    b'\x04\x00\x00\x00\x00\x00\x00' # ping
+)
+
+# the request parsing this repo started with, kept as it was
+class LegacyRequest:
+    def __contains__(self, item: Any) -> bool:
+        return self.__dict__.__contains__(item)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> 'LegacyRequest':
+        req = cls()
+        req.__dict__.update(data)
+        return req
+
+def real_type(value: str) -> Any:
+    if value.replace('-', '', 1).isdecimal():
+        return int(value)
+
+    try: return float(value)
+    except: pass
+
+    return value
+
+def legacy_parse_headers(encoded_headers: bytes) -> dict[str, Any]:
+    headers: dict[str, Any] = {}
+    for idx, header in enumerate(encoded_headers.decode().splitlines()):
+        if idx == 0:
+            m, p, v = header.split()
+            headers['method'] = m
+            headers['path'], headers['params'] = p, {}
+            headers['http_version'] = float(v.replace('HTTP/', ''))
+            continue
+
+        k, v = header.split(': ', 1)
+        headers[k.lower().replace('-', '_')] = real_type(v)
+
+    return headers
+
+def legacy_parse(content: bytes) -> LegacyRequest:
+    headers, body = content.split(b'\r\n\r\n', 1)
+    request = LegacyRequest.from_dict(legacy_parse_headers(headers))
+    request.raw_body = body # type: ignore
+    return request
+
+def legacy() -> list:
+    # the original read the socket once, then parsed the buffer twice
+    requests = []
+    for _ in range(POLLS):
+        data = POLL
+        legacy_parse(data)
+        requests.append(legacy_parse(data))
+
+    return requests
+
+def slotted() -> list:
+    parser = RequestParser(Server())
+    requests = []
+    for _ in range(POLLS):
+        requests.extend(parser.feed(POLL))
+
+    return requests
+
+def measure(func) -> tuple[float, float, float]:
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+
+    requests = func()
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the requests are kept alive, like a queue of polls would
+    retained = (sys.getallocatedblocks() - blocks) / len(requests)
+    del requests
+
+    return retained, current / POLLS, peak / POLLS
+
+def main() -> None:
+    for name, func in (('dict Request', legacy), ('slotted Request', slotted)):
+        blocks, current, peak = measure(func)
+        print(
+            f'{name:>16}: {blocks:5.1f} blocks/request, '
+            f'{current:6.0f}B retained/request, {peak:6.0f}B peak/request'
+        )
+
+if __name__ == '__main__':
+    main()
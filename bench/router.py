@@ -0,0 +1,95 @@
+"""Compares the compiled `Router` against the old two-level route scan
+
+run from the repo root with `python -m bench.router`
+"""
+import re
+import timeit
+from server import Router
+
+# `Server.get` routes in main.py, in registration order
+SERVER_ROUTES: list[re.Pattern] = [
+    re.compile(r'\/osu\/(?P<handler>.*)'),
+    re.compile(r'\/((c[4-6e])|(c))\/(?P<handler>.*)'),
+    re.compile(r'\/a\/(?P<userid>[0-9]*)'),
+    re.compile(r'\/api\/v1\/(?P<path>.*)'),
+    re.compile(r'\/(?P<path>.*)'),
+]
+
+# `glob.handlers` keys, in the order `handlers` registers them
+HANDLERS: list = [
+    '/api/v1/client/tops', '/api/v1/client/recalc',
+    '/api/v1/client/recent', '/api/v1/client/profile',
+    '/api/v1/client/wipe', '/api/v1/profile', '/api/v1/tops',
+    '/api/v1/recent', '/api/v1/recalc', '/api/v1/wipe', 'avatar',
+    '/web/bancho_connect.php', 'login', '/web/lastfm.php',
+    '/web/osu-error.php', '/difficulty-rating', '/web/osu-session.php',
+    '/web/osu-getfriends.php', '/web/osu-markasread.php',
+    re.compile(r'\/ss\/(?P<link>.*)'), '/web/osu-screenshot.php',
+    re.compile(r'\/(beatmaps|beatmapsets)\/(?P<path>.*)'),
+    '/web/osu-submit-modular-selector.php', '/web/osu-getseasonal.php',
+    '/web/osu-getreplay.php', '/web/osu-osz2-getscores.php',
+    re.compile(r'/d/(?P<setid>[0-9]*)'), '/web/osu-search.php',
+    '/favicon.ico', 'score_sub',
+]
+
+PATHS = [
+    '/osu/web/osu-osz2-getscores.php',
+    '/osu/web/osu-submit-modular-selector.php',
+    '/osu/d/1234567',
+    '/osu/beatmapsets/1234567',
+    '/osu/unknown.php',
+]
+
+def old_dispatch(path: str) -> tuple:
+    for route in SERVER_ROUTES:
+        if (result := route.match(path)):
+            args = result.groupdict()
+            break
+    else:
+        return None, {}
+
+    if route is not SERVER_ROUTES[0]:
+        return route, args
+
+    handler_path = f"/{args['handler']}"
+    for handler in HANDLERS:
+        if isinstance(handler, str):
+            if handler != handler_path:
+                continue
+
+            return handler, args
+
+        if (m := handler.match(handler_path)):
+            return handler, args | m.groupdict()
+
+    return None, args
+
+server_router = Router.from_dict({route: route for route in SERVER_ROUTES})
+handler_router = Router.from_dict({handler: handler for handler in HANDLERS})
+
+def new_dispatch(path: str) -> tuple:
+    if not (match := server_router.match(path)):
+        return None, {}
+
+    route, args, _ = match
+    if route is not SERVER_ROUTES[0]:
+        return route, args
+
+    if not (match := handler_router.match(f"/{args['handler']}")):
+        return None, args
+
+    handler, handler_args, _ = match
+    return handler, args | handler_args
+
+def main() -> None:
+    for path in PATHS:
+        assert old_dispatch(path) == new_dispatch(path), path
+
+    number = 100_000
+    for name, func in (('two-level scan', old_dispatch), ('router', new_dispatch)):
+        for path in PATHS:
+            took = timeit.timeit(lambda: func(path), number=number)
+            print(f'{name:>15} {path:<45} {took / number * 1e9:8.0f}ns/lookup')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Requests/sec of the socket core against the `asyncio.Protocol` core
+
+run from the repo root with `python -m bench.server_core`,
+uvloop is used for the server when it's installed
+"""
+import time
+import socket
+import asyncio
+import multiprocessing
+from server import Server
+from server import Response
+
+DURATION = 5.0
+CONNECTIONS = 32
+REQUEST = (
+    b'GET /c/ HTTP/1.1\r\n'
+    b'Host: c.ppy.sh\r\n'
+    b'osu-token: bench\r\n'
+    b'\r\n'
+)
+
+def serve(port: int, use_protocol: bool) -> None:
+    try:
+        import uvloop # type: ignore
+        uvloop.install()
+    except ImportError:
+        pass
+
+    server = Server()
+
+    @server.get(path = '/c/')
+    async def bancho(request) -> Response:
+        return Response(200, b'')
+
+    server.run(
+        bind = ('127.0.0.1', port),
+        listening = 128,
+        use_protocol = use_protocol
+    )
+
+async def client(port: int, deadline: float) -> int:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    done = 0
+
+    while time.perf_counter() < deadline:
+        writer.write(REQUEST)
+        await reader.readuntil(b'\r\n\r\n') # empty body
+        done += 1
+
+    writer.close()
+    return done
+
+async def load(port: int) -> float:
+    deadline = time.perf_counter() + DURATION
+    done = await asyncio.gather(*[
+        client(port, deadline) for _ in range(CONNECTIONS)
+    ])
+    return sum(done) / DURATION
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def main() -> None:
+    for name, use_protocol in (('socket', False), ('protocol', True)):
+        port = free_port()
+        proc = multiprocessing.Process(
+            target = serve, args = (port, use_protocol), daemon = True
+        )
+        proc.start()
+        time.sleep(1)
+
+        try:
+            rps = asyncio.run(load(port))
+        finally:
+            proc.terminate()
+            proc.join()
+
+        print(f'{name:>8} core: {rps:10.0f} req/s')
+
+if __name__ == '__main__':
+    main()
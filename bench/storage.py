@@ -0,0 +1,65 @@
+"""Time of the score lookups a profile with 10k plays does, scanning
+the json profile against the indexed sqlite queries
+
+run from the repo root with `python -m bench.storage`
+"""
+import time
+import orjson
+import tempfile
+from ext import glob
+from pathlib import Path
+from typing import Callable
+from objects.writer import Writer
+from objects.jsonfile import JsonFile
+from objects.replays import ReplayStore
+from objects.storage import Storage
+from objects.storage import JsonStorage
+from objects.storage import SQLiteStorage
+from bench.jsonfile_wal import NAME
+from bench.jsonfile_wal import PLAYS
+from bench.jsonfile_wal import profile
+
+RUNS = 200
+
+LOOKUPS: dict[str, Callable[[Storage], object]] = {
+    'top 100': lambda s: s.top(NAME, 100),
+    'recent 50': lambda s: s.recent(NAME, 50),
+    'personal best': lambda s: s.best(NAME, f'{7:032x}', 'ranked'),
+    'replay check': lambda s: s.has_replay(NAME, f'{PLAYS - 1:032x}'),
+    'play count': lambda s: s.count(NAME),
+}
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'profiles.json'
+        path.write_bytes(orjson.dumps(profile()))
+        glob.writer = Writer()
+        glob.profiles = JsonFile(path, writer = glob.writer)
+        # like on start up, before the scores are imported
+        glob.replays = ReplayStore(Path(tmp) / 'replays', glob.writer)
+        glob.replays.migrate(glob.profiles)
+
+        storages = (
+            ('json', JsonStorage()),
+            ('sqlite', SQLiteStorage(Path(tmp) / 'scores.db'))
+        )
+        for lookup, run in LOOKUPS.items():
+            timings = []
+            for _, storage in storages:
+                start = time.perf_counter()
+                for _ in range(RUNS):
+                    run(storage)
+
+                timings.append((time.perf_counter() - start) / RUNS)
+
+            json_time, sqlite_time = timings
+            print(
+                f'{lookup:>14}: json {json_time * 1000:8.3f}ms, '
+                f'sqlite {sqlite_time * 1000:8.3f}ms '
+                f'({json_time / sqlite_time:7.1f}x)'
+            )
+
+        glob.writer.close()
+
+if __name__ == '__main__':
+    main()
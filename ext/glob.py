@@ -2,7 +2,6 @@ import os
 import re
 import sys
 import asyncio
-from typing import Any
 from pathlib import Path
 from typing import Union
 from pyimgur import Imgur
@@ -12,25 +11,36 @@ from typing import TYPE_CHECKING
 from aiohttp import ClientSession
 
 if TYPE_CHECKING:
+    from server import Router
     from objects.file import File
-    from objects.player import Player
+    from objects.sessions import Sessions
+    from objects.writer import Writer
+    from objects.replays import ReplayStore
+    from objects.storage import Storage
     from objects.jsonfile import JsonFile
 
 pfps: 'JsonFile'
 modified_txt: Path
+router: 'Router'
 http: ClientSession
 beatmaps: 'JsonFile'
 profiles: 'JsonFile'
 default_avatar: bytes
+sessions: 'Sessions'
+storage: 'Storage'
+writer: 'Writer'
+replays: 'ReplayStore'
 lock = asyncio.Lock()
+data_version: int = 0
+flush_interval: float = 1.0
+flush_timer: Optional[asyncio.TimerHandle] = None
+pending_packets = bytearray()
 modified_beatmaps: 'JsonFile'
 imgur: Optional[Imgur] = None
-player: Optional['Player'] = None
 osu_exe_path: Optional[Path] = None
 songs_folder: Optional[Path] = None
 replay_folder: Optional['File'] = None
 screenshot_folder: Optional[Path] = None
-current_profile: Optional[dict[str, Any]] = None
 handlers: dict[Union[str, re.Pattern], Callable] = {}
 
 using_wsl = (
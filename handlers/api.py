@@ -11,7 +11,6 @@ from server import Request
 from objects import Player
 from server import Response
 from objects import Beatmap
-from typing import Optional
 from objects import ModifiedBeatmap
 
 JSON = orjson.dumps
@@ -24,8 +23,8 @@ JSON = orjson.dumps
 async def client_handlers(request: Request) -> Response:
     path = request.path.replace('/client', '')
 
-    if glob.player:
-        request.params['u'] = glob.player.name
+    if (p := glob.sessions.from_request(request)):
+        request.params['u'] = p.name
         log(
             f'handling {path.split("/")[-1]} button for client',
             color = Color.GREEN
@@ -68,9 +67,6 @@ async def profile(request: Request) -> Response:
         headers = {'Content-type': 'application/json charset=utf-8'}
     )
 
-SCORES = list[dict]
-RANKED_PLAYS = dict[str, list[dict]]
-APPROVED_PLAYS = RANKED_PLAYS
 @handler('/api/v1/tops')
 async def tops(request: Request) -> Response:
     if (
@@ -89,10 +85,7 @@ async def tops(request: Request) -> Response:
             headers = {'Content-type': 'application/json charset=utf-8'}
         )
 
-    if 'limit' not in params:
-        limit = 100
-    else:
-        limit = params['limit']
+    limit: int = params.get_int('limit', 100) # type: ignore
 
     name: str = params['u']
     if name not in glob.profiles:
@@ -105,31 +98,15 @@ async def tops(request: Request) -> Response:
             headers = {'Content-type': 'application/json charset=utf-8'}
         )
 
-    profile = glob.profiles[name]
     response_json = {
         'status': 'success!',
         'name': name,
         'plays': []
     }
 
-    scores: SCORES = []
-
-    ranked_plays: Optional[RANKED_PLAYS] = \
-    profile['plays']['ranked_plays']
-
-    approved_plays: Optional[APPROVED_PLAYS] = \
-    profile['plays']['approved_plays']
-
-    for plays in (ranked_plays, approved_plays):
-        if plays:
-            for v in plays.values():
-                scores.extend(v)
-
-    scores.sort(key = lambda s: s['pp'], reverse = True)
-    top_scores = utils.filter_top_scores(scores[:limit])
-    top_scores.sort(key = lambda s: s['pp'], reverse = True)
-
-    for play in top_scores.copy():
+    for play in glob.storage.top(name, limit):
+        # stored plays are left as they are
+        play = play.copy()
         bmap = (
             await ModifiedBeatmap.from_md5(play['md5']) or
             await Beatmap.from_md5(play['md5'])
@@ -151,9 +128,6 @@ async def tops(request: Request) -> Response:
         else:
             play['bmap'] = None
 
-        try: del play['replay_frames']
-        except: pass
-
         response_json['plays'].append(play)
 
     return Response(
@@ -191,31 +165,16 @@ async def recent(request: Request) -> Response:
             headers = {'Content-type': 'application/json charset=utf-8'}
         )
 
-    if 'limit' not in params:
-        limit = 100
-    else:
-        limit = params['limit']
+    limit: int = params.get_int('limit', 100) # type: ignore
 
-    profile = glob.profiles[name]
     response_json = {
         'status': 'success!',
         'name': name,
         'plays': []
     }
 
-    scores: Optional[SCORES] = \
-    profile['plays']['all_plays']
-
-    if not scores:
-        scores = []
-
-    scores.sort(
-        key = lambda s: s['time']
-        if 'time' in s else 0,
-        reverse = True
-    )
-
-    for play in scores[:limit].copy():
+    for play in glob.storage.recent(name, limit):
+        play = play.copy()
         bmap = (
             await ModifiedBeatmap.from_md5(play['md5']) or
             await Beatmap.from_md5(play['md5'])
@@ -237,9 +196,6 @@ async def recent(request: Request) -> Response:
         else:
             play['bmap'] = None
 
-        try: del play['replay_frames']
-        except: pass
-
         response_json['plays'].append(play)
 
     return Response(
@@ -267,7 +223,6 @@ async def _recalc(md5: str, score: Score) -> dict:
     score.acc = acc
     return score.as_dict()
 
-ACCEPTED_PLAYS = ('ranked_plays', 'approved_plays')
 @handler('/api/v1/recalc')
 async def recalc(request: Request) -> Response:
     # TODO: make use of the params
@@ -279,38 +234,25 @@ async def recalc(request: Request) -> Response:
             color = Color.LIGHTMAGENTA_EX
         )
 
-        profile = profiles[profile_name]
+        plays = list(glob.storage.scores(profile_name))
+        recalculated = []
+        for idx, play in enumerate(plays):
+            recalculated.append((play, await _recalc(
+                md5 = play['md5'],
+                score = Score.from_dict(
+                    play, ignore_binascii_errors = True
+                )
+            )))
 
-        for index_of_type_plays, map_status in enumerate(ACCEPTED_PLAYS):
-            msg = (
-                f"calculating {map_status[:-6]} maps of {profile_name}\n"
-                f'{index_of_type_plays + 1}/2 calculated.'
+            log(
+                f'{idx + 1}/{len(plays)}',
+                f'plays of {profile_name} calculated.',
+                color = Color.LIGHTMAGENTA_EX
             )
 
-            log(msg, color = Color.LIGHTMAGENTA_EX)
-            plays: dict[str, list[dict]] = profile['plays'][map_status]
-
-            for index_of_maps, (md5, map_plays) in enumerate(plays.items()):
-                for idx, play in enumerate(map_plays):
-                    map_plays[idx] = await _recalc(
-                        md5 = md5,
-                        score = Score.from_dict(
-                            play, ignore_binascii_errors = True
-                        )
-                    )
-
-                    log(
-                        f'{idx+1}/{len(map_plays)}',
-                        'plays in this map calculated.',
-                        color = Color.LIGHTMAGENTA_EX
-                    )
-
-                log(
-                    f'{index_of_maps + 1}/{len(plays.values())}',
-                    'maps calculated.', color = Color.LIGHTMAGENTA_EX
-                )
+        glob.storage.update(profile_name, recalculated)
 
-    utils.update_files()
+    utils.flush_files()
     response_msg = {
         'status': 'success!',
         'message': 'all profiles were calculated!'
@@ -353,14 +295,12 @@ async def wipe_profile(request: Request) -> Response:
     glob.profiles.update(
         queries.init_profile(name)
     )
+    glob.storage.wipe(name)
 
-    utils.update_files()
+    utils.flush_files()
 
-    if (
-        glob.player and
-        glob.player.name == name
-    ):
-        await glob.player.update()
+    if (p := glob.sessions.from_name(name)):
+        await p.update()
 
     response_msg = {
         'status': 'success!',
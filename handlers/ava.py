@@ -1,14 +1,14 @@
 import utils
 from ext import glob
 from utils import handler
+from server import Request
 from server import Response
+from server import FileResponse
 
 @handler('avatar')
-async def avatar(userid: int) -> Response:
-    if not glob.player:
-        return Response(404, b'')
-    
-    if userid != 2:
+async def avatar(request: Request, userid: int) -> Response:
+    # ids that aren't a local profile's belong to players on bancho
+    if not (name := glob.sessions.name_of(userid)):
         url = f'https://a.ppy.sh/{userid}?.png'
         async with glob.http.get(url) as resp:
             if not resp or resp.status != 200:
@@ -17,14 +17,14 @@ async def avatar(userid: int) -> Response:
             return Response(200, await resp.content.read())
     
     if (
-        glob.player.name not in glob.pfps or
-        glob.pfps[glob.player.name] is None
+        name not in glob.pfps or
+        glob.pfps[name] is None
     ):
         return Response(200, glob.default_avatar)
     
-    pfp: str = glob.pfps[glob.player.name]
+    pfp: str = glob.pfps[name]
     if (path := utils.is_path(pfp)):
-        return Response(200, path.read_bytes())
+        return FileResponse(path)
 
     async with glob.http.get(pfp) as resp:
         if not resp or resp.status != 200:
@@ -1,3 +1,4 @@
+import time
 import config
 import packets
 import asyncio
@@ -9,7 +10,6 @@ from server import Request
 from objects import Player
 from typing import Optional
 from server import Response
-import urllib.parse as urlparse
 
 WELCOME_MSG = '\n'.join([
     'Welcome {name}!',
@@ -39,32 +39,55 @@ BUTTONS: list[BUTTON] = [
 CHO_TOKEN = str
 BODY = bytearray
 
-profile_name: Optional[str] = None
+# seconds login waits for bancho_connect to send the name
+LOGIN_TIMEOUT = 1.0
+
+# bancho_connect and login can come in either order, the one that
+# comes first leaves a future for the other under the client's key
+CLIENT_KEY = tuple[str, str]
+handoffs: dict[CLIENT_KEY, asyncio.Future] = {}
+
+def client_key(request: Request) -> CLIENT_KEY:
+    return (request.client, request.get_str('user_agent', '')) # type: ignore
+
+def handoff(key: CLIENT_KEY) -> asyncio.Future:
+    if (fut := handoffs.get(key)) is None:
+        fut = handoffs[key] = asyncio.get_running_loop().create_future()
+
+    return fut
 
 # should be in web, but works with cho
 # to have login work "properly"
 @handler('/web/bancho_connect.php')
 async def bancho_connect(request: Request) -> Response:
-    global profile_name
-    profile_name = urlparse.unquote(request.params['u']).strip()
-    log('Got a player name of', profile_name, color = Color.LIGHTBLUE_EX)
+    name = request.params.get_str('u', '').strip() # type: ignore
+    log('Got a player name of', name, color = Color.LIGHTBLUE_EX)
+
+    key = client_key(request)
+    # a reconnect before logging in replaces the last name
+    if handoff(key).done():
+        del handoffs[key]
+
+    handoff(key).set_result(name)
     return Response(200, b'')
 
 @handler('login')
-async def login() -> tuple[BODY, CHO_TOKEN]:
-    global profile_name
+async def login(request: Request) -> tuple[BODY, CHO_TOKEN]:
     body = bytearray()
 
-    wait_loops = 0
-
-    while (
-        profile_name is None and
-        wait_loops < 5
-    ):
-        await asyncio.sleep(0.2)
-        wait_loops += 1
+    key = client_key(request)
+    fut = handoff(key)
+    try:
+        profile_name: Optional[str] = await asyncio.wait_for(
+            asyncio.shield(fut), LOGIN_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        profile_name = None
+    finally:
+        if handoffs.get(key) is fut:
+            del handoffs[key]
 
-    if profile_name is None:
+    if not profile_name:
         body += packets.userID(-5)
         body += packets.notification(
             'Please restart your game to login!'
@@ -72,8 +95,8 @@ async def login() -> tuple[BODY, CHO_TOKEN]:
         log('Player needs to restart game!', color = Color.YELLOW)
         return body, 'fail'
 
-    glob.player = p = Player(profile_name, from_login=True)
-    glob.current_profile = glob.profiles[p.name]
+    p = Player(profile_name, from_login=True)
+    p.client = request.client
 
     body += packets.userID(p.userid)
     body += packets.notification((
@@ -103,24 +126,93 @@ async def login() -> tuple[BODY, CHO_TOKEN]:
     for channel in CHANNELS:
         body += packets.channelJoin(channel[0])
 
-    await glob.player.update()
+    await p.update()
     body += packets.userPresence(p)
-    profile_name = None
 
-    glob.player.queue += packets.sendMsg(
+    # the players already online and this one learn about each other
+    for other in glob.sessions:
+        if other.name == p.name: # the session this login replaces
+            continue
+
+        body += packets.userPresence(other)
+        body += packets.userStats(other)
+        other.queue += packets.userPresence(p) + packets.userStats(p)
+
+    p.queue += packets.sendMsg(
         client = 'local',
-        msg = WELCOME_MSG.format(name=glob.player.name),
+        msg = WELCOME_MSG.format(name=p.name),
         target = '#osu',
         userid = -1,
     )
 
     for url, name in BUTTONS:
-        glob.player.queue += packets.sendMsg(
+        p.queue += packets.sendMsg(
             client = 'local',
             msg = f'[{url} {name}]',
             target = '#osu',
             userid = -1,
         )
 
-    log(glob.player.name, 'successfully logged in!', color = Color.GREEN)
-    return body, 'success'
\ No newline at end of file
+    # queued before anyone was online, so every session gets them
+    if glob.pending_packets:
+        p.queue += glob.pending_packets
+
+    glob.sessions.add(p)
+    log(p.name, 'successfully logged in!', color = Color.GREEN)
+    return body, p.token
+
+@packets.register(packets.PacketIDS.OSU_PING)
+async def ping(p: Player, reader: packets.PacketReader) -> None:
+    pass
+
+@packets.register(packets.PacketIDS.OSU_CHANGE_ACTION)
+async def change_action(p: Player, reader: packets.PacketReader) -> None:
+    p.action = reader.read_unsigned_byte()
+    p.info_text = reader.read_string()
+    p.map_md5 = reader.read_string()
+    p.mods = reader.read_unsigned_int()
+    p.mode = reader.read_unsigned_byte()
+    p.map_id = reader.read_int()
+
+    for other in glob.sessions:
+        other.queue += packets.userStats(p)
+
+@packets.register(packets.PacketIDS.OSU_REQUEST_STATUS_UPDATE)
+async def request_status_update(p: Player, reader: packets.PacketReader) -> None:
+    p.queue += packets.userStats(p)
+
+@packets.register(packets.PacketIDS.OSU_USER_STATS_REQUEST)
+async def user_stats_request(p: Player, reader: packets.PacketReader) -> None:
+    for userid in reader.read_list32():
+        if (other := glob.sessions.from_userid(userid)):
+            p.queue += packets.userStats(other)
+
+@packets.register(packets.PacketIDS.OSU_USER_PRESENCE_REQUEST)
+async def user_presence_request(p: Player, reader: packets.PacketReader) -> None:
+    for userid in reader.read_list32():
+        if (other := glob.sessions.from_userid(userid)):
+            p.queue += packets.userPresence(other)
+
+@packets.register(packets.PacketIDS.OSU_USER_PRESENCE_REQUEST_ALL)
+async def user_presence_request_all(p: Player, reader: packets.PacketReader) -> None:
+    for other in glob.sessions:
+        p.queue += packets.userPresence(other)
+
+@packets.register(packets.PacketIDS.OSU_SEND_PUBLIC_MESSAGE)
+async def send_public_message(p: Player, reader: packets.PacketReader) -> None:
+    reader.read_string() # sender, always empty from the client
+    msg = reader.read_string()
+    target = reader.read_string()
+    log(f'{p.name} -> {target}:', msg, color = Color.LIGHTBLUE_EX)
+
+@packets.register(packets.PacketIDS.OSU_LOGOUT)
+async def logout(p: Player, reader: packets.PacketReader) -> None:
+    # osu! sends a logout right after logging in sometimes, ignore those
+    if time.time() - p.login_time < 1:
+        return
+
+    glob.sessions.remove(p)
+    for other in glob.sessions:
+        other.queue += packets.logout(p.userid)
+
+    log(p.name, 'logged out', color = Color.YELLOW)
@@ -1,5 +1,6 @@
 import utils
 import config
+import asyncio
 import packets
 from ext import glob
 from utils import log
@@ -8,11 +9,8 @@ import pyttanko as oppai
 from utils import handler
 from objects import Score
 from objects import Beatmap
-from typing import Optional
 from objects import ModifiedBeatmap
 
-RANKED_PLAYS = dict[str, list[dict]]
-
 def get_grade(score: Score) -> str:
     total = score.n300 + score.n100 + score.n50 + score.nmiss
     n300_percent = score.n300 / total
@@ -36,8 +34,6 @@ def get_grade(score: Score) -> str:
     
     return 'D'
 
-SCORE = list[dict]
-
 leaderboard_worthy = (1, 2, 3, 4)
 status_to_db = {
     1: 'ranked',
@@ -53,46 +49,38 @@ else:
 
 @handler('score_sub')
 async def submit_score() -> None:
-    if not glob.player:
-        return
-    
-    if not glob.current_profile:
-        return
-    
     score = Score.from_score_sub()
     if not score:
         return
 
-    if score.name != glob.player.name:
-        glob.player.queue += packets.notification(
+    # replays are matched to whoever is logged in under their name
+    if not (p := glob.sessions.from_name(score.name)):
+        utils.add_to_player_queue(packets.notification(
             "Can't submit another person's replay!"
-        )
+        ))
         return 
     
-    if (
-        score.replay_md5 in
-        glob.current_profile['plays']['replay_md5']
-    ):
-        glob.player.queue += packets.notification(
+    if glob.storage.has_replay(p.name, score.replay_md5):
+        p.queue += packets.notification(
             "Can't submit the same replay!"
         )
         return 
     
     # if cinema, autopilot, cinema, or relax in mods
     if score.mods & INVALID_MODS:
-        glob.player.queue += packets.notification(
+        p.queue += packets.notification(
             "Invalid mods to submit!"
         )
         return 
     
     if score.is_failed:
-        glob.player.queue += packets.notification(
+        p.queue += packets.notification(
             "Can't submit failed replays!"
         )
         return
     
     if score.mode != 0:
-        glob.player.queue += packets.notification(
+        p.queue += packets.notification(
             "Must be a standard score!"
         )
         return
@@ -102,15 +90,15 @@ async def submit_score() -> None:
         await Beatmap.from_md5(score.md5)
     )
     if not bmap:
-        glob.player.queue += packets.notification("Map has to exist on bancho!")
+        p.queue += packets.notification("Map has to exist on bancho!")
         return
     
     if bmap.approved not in leaderboard_worthy:
-        glob.player.queue += packets.notification("Map can't be unranked!")
+        p.queue += packets.notification("Map can't be unranked!")
         return
     
     if not await bmap.get_file():
-        glob.player.queue += packets.notification(
+        p.queue += packets.notification(
             "Can't seem to get .osu file for this map!"
         )
         return
@@ -126,41 +114,15 @@ async def submit_score() -> None:
     mods_str = oppai.mods_str(score.mods).upper()
     score.mods_str = 'NM' if mods_str == 'NOMOD' else mods_str
     
-    all_plays: Optional[SCORE] = \
-    glob.current_profile['plays']['all_plays']
-    
-    if all_plays is None:
-        return 
-    
-    score.scoreid = len(all_plays) + 1
-    
-    score_dict = score.as_dict()
-    all_plays.append(score_dict)
-
-    key = f'{status_to_db[bmap.approved]}_plays'
-
-    type_plays: Optional[dict[str, list[dict]]] = \
-    glob.current_profile['plays'][key]
-
-    if type_plays is None:
-        return
-
-    if score.md5 not in type_plays:
-        type_plays[score.md5] = [score_dict]
-    else:
-        type_plays[score.md5].append(score_dict)
-
-    replay_md5s: Optional[list[str]] = \
-    glob.current_profile['plays']['replay_md5']
-    
-    if replay_md5s is None:
-        return 
-    
-    if score.replay_md5:
-        replay_md5s.append(score.replay_md5)
+    if (replay_md5 := glob.replays.save(score.replay_md5, score.replay_frames)):
+        score.replay_md5 = replay_md5
+    score.scoreid = glob.storage.add(
+        p.name, score.as_dict(), status_to_db[bmap.approved]
+    )
 
-    utils.update_files()
-    await glob.player.update()
+    # the score is on disk before anyone's told it was submitted
+    await asyncio.wrap_future(utils.flush_files())
+    await p.update()
 
     score_str = (
         f'{bmap.artist} - {bmap.title} [{bmap.version}]\n'
@@ -169,7 +131,7 @@ async def submit_score() -> None:
         f'was successfully submitted!'
     )
 
-    glob.player.queue += packets.notification(score_str)
+    p.queue += packets.notification(score_str)
 
     """Sends score to recent channel"""
     msg = (
@@ -178,13 +140,13 @@ async def submit_score() -> None:
         f'{score.max_combo}x/{bmap.max_combo}x {score.nmiss}X'
     )
     if config.ping_user_when_recent_score:
-        msg += f'\nachieved by {glob.player.name}'
+        msg += f'\nachieved by {p.name}'
     
-    glob.player.queue += packets.sendMsg(
+    p.queue += packets.sendMsg(
         client = 'local',
         msg = msg,
         target = '#recent',
         userid = -1,
     )
 
-    log(glob.player.name, 'has successfully submitted a score!', color = Color.GREEN)
\ No newline at end of file
+    log(p.name, 'has successfully submitted a score!', color = Color.GREEN)
\ No newline at end of file
@@ -11,12 +11,15 @@ from utils import Color
 from utils import handler
 from server import Request
 from server import Response
+from server import FileResponse
+from server import StaticResponse
 from objects import Leaderboard
 import urllib.parse as urlparse
 from objects import ModifiedLeaderboard
 
+DEFAULT_RESPONSE = StaticResponse(200, b'')
 async def DEFAULT_RESPONSE_FUNC(request: Request) -> Response:
-    return Response(200, b'')
+    return DEFAULT_RESPONSE
 
 # unusable or unused handlers
 for hand in [
@@ -75,22 +78,20 @@ DEFAULT_CHARTS = '\n'.join([
     "chartId:beatmap|chartUrl:https://osu.ppy.sh/b/0|chartName:Beatmap Ranking|rankBefore:|rankAfter:0|maxComboBefore:|maxComboAfter:0|accuracyBefore:|accuracyAfter:0|rankedScoreBefore:|rankedScoreAfter:0|ppBefore:|ppAfter:0|onlineScoreId:0",
     "chartId:overall|chartUrl:https://osu.ppy.sh/u/2|chartName:Overall Ranking|rankBefore:0|rankAfter:0|rankedScoreBefore:0|rankedScoreAfter:0|totalScoreBefore:0|totalScoreAfter:0|maxComboBefore:0|maxComboAfter:0|accuracyBefore:0|accuracyAfter:0|ppBefore:0|ppAfter:0|achievements-new:|onlineScoreId:0"
 ]).encode()
+CHARTS_RESPONSE = StaticResponse(200, DEFAULT_CHARTS)
 @handler('/web/osu-submit-modular-selector.php')
 async def score_sub(request: Request) -> Response:
     global REMINDER
-    if (
-        not glob.player or 
-        not glob.current_profile
-    ):
+    if not (p := glob.sessions.from_request(request)):
         return Response(200, b"error: no")
     
     if REMINDER is None:
-        glob.player.queue += packets.notification((
+        p.queue += packets.notification((
             'To submit a play be sure to save the replay of the play!'
         ))
         REMINDER = 0
     elif REMINDER == 50:
-        glob.player.queue += packets.notification((
+        p.queue += packets.notification((
             'Just a reminder\n'
             'To submit a play be sure to save the replay of the play!'
         ))
@@ -98,21 +99,20 @@ async def score_sub(request: Request) -> Response:
     
     REMINDER += 1
     
-    if 'playcount' in glob.current_profile:
-        glob.current_profile['playcount'] += 1
-    else:
-        glob.current_profile['playcount'] = 1
+    playcount = p.profile.get('playcount', 0) + 1
+    glob.profiles.set((p.name, 'playcount'), playcount)
     
-    utils.update_files()
+    utils.files_changed()
 
-    glob.player.queue += packets.userStats(glob.player)
+    p.playcount = playcount
+    p.queue += packets.userStats(p)
 
     log(
-        f"{glob.player.name}'s playcount increased!", 
+        f"{p.name}'s playcount increased!", 
         color = Color.GREEN
     )
     
-    return Response(200, DEFAULT_CHARTS)
+    return CHARTS_RESPONSE
 
 @handler('/web/osu-getseasonal.php')
 async def get_bgs(request: Request) -> Response:
@@ -125,13 +125,13 @@ async def get_bgs(request: Request) -> Response:
 
 @handler('/web/osu-getreplay.php')
 async def get_replay(request: Request) -> Response:
-    scoreid = request.params['c']
+    scoreid: int = request.params.get_int('c', 0) # type: ignore
 
     if scoreid > 0:
         params = {
             'k': config.osu_api_key,
-            's': request.params['c'],
-            'm': request.params['m']
+            's': scoreid,
+            'm': request.params.get_int('m', 0)
         }
         async with glob.http.get(
             url = f'{OSU_API_BASE}/get_replay',
@@ -146,35 +146,21 @@ async def get_replay(request: Request) -> Response:
         log('bancho replay handled', color = Color.LIGHTGREEN_EX)
         return Response(200, replay_frames)
 
-    elif (glob.player and glob.current_profile):
-        real_id = abs(scoreid) - 1
-        play = glob.current_profile['plays']['all_plays'][real_id].copy()
+    elif (p := glob.sessions.from_request(request)):
+        play = glob.storage.get(p.name, abs(scoreid)) or {}
 
-        if (
-            'replay_frames' not in play or
-            play['replay_frames'] is None
-        ):
+        if not (path := glob.replays.path(play.get('replay_md5'))):
             log(
-                f'no replay frames were found for scoreid: {real_id}',
+                f'no replay frames were found for scoreid: {abs(scoreid)}',
                 color = Color.RED
             )
             return Response(200, b'error: no')
         else:
             log(
-                f"{glob.player.name}'s replay was handled", 
+                f"{p.name}'s replay was handled", 
                 color = Color.LIGHTGREEN_EX
             )
-
-            if "b\'" == play['replay_frames'][:2]:
-                exec(f'def get_bytes(): return {play["replay_frames"]}')
-                replay: bytes = locals()['get_bytes']()
-            else:
-                replay = utils.string_to_bytes(play['replay_frames'])
-
-            return Response(
-                code = 200, 
-                body = replay
-            )
+            return FileResponse(path)
     else:
         log('error handling replay', color = Color.RED)
         return Response(200, b'error: no')
@@ -186,16 +172,18 @@ MODIFIED_REGEXES = (
 
 @handler('/web/osu-osz2-getscores.php')
 async def leaderboard(request: Request) -> Response:
-    if not glob.player:
+    if not (p := glob.sessions.from_request(request)):
         return Response(404, b'how')
 
     parsed_params = {
-        'filename': urlparse.unquote(request.params['f']).replace('+', ' ').replace('  ', '+ '),
-        'mods': request.params['mods'],
-        'mode': request.params['m'],
-        'rank_type': request.params['v'],
-        'set_id': request.params['i'],
-        'md5': request.params['c']
+        'player': p,
+        # osu! doesn't escape `+` in filenames, so this is decoded by hand
+        'filename': urlparse.unquote(request.params.get_raw('f', '')).replace('+', ' ').replace('  ', '+ '), # type: ignore
+        'mods': request.params.get_int('mods', 0),
+        'mode': request.params.get_int('m', 0),
+        'rank_type': request.params.get_int('v', 0),
+        'set_id': request.params.get_int('i', 0),
+        'md5': request.params.get_str('c', '')
     }
 
     regex_results = [
@@ -284,24 +272,24 @@ DIRECT_BASE_API = 'https://beatconnect.io/api'
 @handler('/web/osu-search.php')
 async def direct(request: Request) -> Response:
     if not config.beatconnect_api_key:
-        utils.add_to_player_queue(
-            packets.notification("No api key given for direct!")
-        )
+        if (p := glob.sessions.from_request(request)):
+            p.queue += packets.notification("No api key given for direct!")
+
         return Response(200, b'0')
     
     beatconnect_params = {
         'token': config.beatconnect_api_key,
     }
     client_params = request.params
-    client_params['q'] = query = urlparse.unquote_plus(client_params['q'])
+    query: str = client_params.get_str('q', '') # type: ignore
 
-    if client_params['q'] not in ("Newest", "Top Rated", "Most Played"):
-        beatconnect_params['q'] = urlparse.unquote_plus(client_params['q'])
+    if query not in ("Newest", "Top Rated", "Most Played"):
+        beatconnect_params['q'] = query
     
-    if client_params['m'] != -1:
-        beatconnect_params['m'] = DIRECT_TO_MIRROR_MODE[client_params['m']]
+    if (mode := client_params.get_int('m', -1)) != -1:
+        beatconnect_params['m'] = DIRECT_TO_MIRROR_MODE[mode] # type: ignore
     
-    beatconnect_params['s'] = DIRECT_TO_API_STATUS[client_params['r']]
+    beatconnect_params['s'] = DIRECT_TO_API_STATUS[client_params.get_int('r', 4)] # type: ignore
     
     async with glob.http.get(
         url = f'{DIRECT_BASE_API}/search', 
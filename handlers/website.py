@@ -1,7 +1,9 @@
 from utils import handler
 from server import Request
 from server import Response
+from server import StaticResponse
 
+FAVICON = StaticResponse(200, b'')
 @handler('/favicon.ico')
 async def favicon(request: Request) -> Response:
-    return Response(200, b'')
\ No newline at end of file
+    return FAVICON
\ No newline at end of file
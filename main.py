@@ -6,15 +6,22 @@ import asyncio
 from ext import glob
 from utils import log
 from utils import Color
+from server import Router
 from server import Server
 from server import Request
 from server import Response
+from server import StaticResponse
+from server import RequeueResponse
 
 import utils
 import config
 import pyimgur
 import colorama
 from objects import File
+from objects import Writer
+from objects import Sessions
+from objects import ReplayStore
+from objects import open_storage
 from pathlib import Path
 from aiohttp import ClientSession
 from objects.jsonfile import JsonFile
@@ -66,10 +73,16 @@ async def on_start_up() -> None:
     if not data_folder.exists():
         data_folder.mkdir(exist_ok=True)
     
-    glob.pfps = JsonFile(data_folder / 'pfps.json')
-    glob.beatmaps = JsonFile(data_folder / 'beatmaps.json')
-    glob.profiles = JsonFile(data_folder / 'profiles.json')
-    glob.modified_beatmaps = JsonFile(data_folder / 'modified.json')
+    glob.writer = writer = Writer()
+    glob.pfps = JsonFile(data_folder / 'pfps.json', writer = writer)
+    glob.beatmaps = JsonFile(data_folder / 'beatmaps.json', writer = writer)
+    glob.profiles = JsonFile(data_folder / 'profiles.json', writer = writer)
+    glob.modified_beatmaps = JsonFile(data_folder / 'modified.json', writer = writer)
+    glob.replays = ReplayStore(data_folder / 'replays', writer)
+    glob.replays.migrate(glob.profiles)
+    glob.storage = open_storage(getattr(config, 'storage', 'json'), data_folder)
+    glob.flush_interval = getattr(config, 'flush_interval', 1.0)
+    glob.sessions = Sessions()
 
     async with glob.http.get('https://a.ppy.sh/') as resp:
         if not resp or resp.status != 200:
@@ -78,6 +91,12 @@ async def on_start_up() -> None:
         
         glob.default_avatar = await resp.content.read()
 
+def on_shut_down() -> None:
+    # changes still waiting on the next flush
+    if hasattr(glob, 'profiles'):
+        utils.flush_files()
+        glob.writer.close()
+
 async def while_server_running() -> None:
     if glob.replay_folder is None:
         utils.add_to_player_queue(packets.notification((
@@ -87,57 +106,72 @@ async def while_server_running() -> None:
         return
     
     while await asyncio.sleep(0.5, result=True):
-        if glob.replay_folder.is_changed() and glob.player:
+        if glob.replay_folder.is_changed() and glob.sessions:
             try:
                 await glob.handlers['score_sub']() 
             except Exception as e:
                 log(str(e), color = Color.RED)
 
-server = Server()
-DEFAULT_RESPONSE = Response(200, b'')
-@server.get(
-    path = re.compile(r'\/osu\/(?P<handler>.*)')
+server = Server(
+    compression_level = getattr(config, 'compression_level', 6),
+    max_connections = getattr(config, 'max_connections', 256),
+    keep_alive_timeout = getattr(config, 'keep_alive_timeout', 15.0)
+)
+server.data_version = lambda: glob.data_version
+server.gauges = lambda: {
+    'data_write_seconds_total': ('counter', glob.writer.write_time),
+    'data_write_blocked_seconds_total': ('counter', glob.writer.blocked_time),
+}
+DEFAULT_RESPONSE = StaticResponse(200, b'')
+@server.route(
+    path = re.compile(r'\/osu\/(?P<handler>.*)'),
+    methods = ['GET', 'POST']
 )
 async def osu(request: Request) -> Response:
     path = f"/{request.args['handler']}"
 
-    for handler in glob.handlers:
-        if isinstance(handler, str):
-            if handler != path:
-                continue
-            
-            resp = await glob.handlers[handler](request)
-            return resp
-        
-        if (m := handler.match(path)):
-            request.args |= m.groupdict()
-            resp = await glob.handlers[handler](request)
-            return resp
-        
-        continue
+    if (match := glob.router.match(path)):
+        handler, args, request.route = match
+        request.args |= args
+        return await handler(request)
         
     log(path, "isn't handled", color = Color.RED)
     return DEFAULT_RESPONSE
 
-@server.get(
+LONG_POLL_TIMEOUT: float = getattr(config, 'long_poll_timeout', 0)
+@server.route(
     path = re.compile(r'\/((c[4-6e])|(c))\/(?P<handler>.*)'),
+    methods = ['GET', 'POST']
 )
 async def bancho(request: Request) -> Response:
     if 'osu_token' not in request:
         body: bytes
         token: str
-        body, token = await glob.handlers['login']()
+        body, token = await glob.handlers['login'](request)
         return Response(
             code = 200, 
             body = body, 
             headers = {"cho-token": token}
         )
 
-    if not glob.player:
+    # unknown tokens are from before a restart, or logged out
+    if not (p := glob.sessions.from_token(request.osu_token)):
         return Response(200, packets.systemRestart())
 
-    if glob.player.queue:
-        return Response(200, glob.player.clear())
+    if request.raw_body:
+        await packets.handle(p, request.raw_body)
+
+    if not p.queue and LONG_POLL_TIMEOUT:
+        # hold the poll open until something is queued
+        try:
+            await asyncio.wait_for(p.queue_event.wait(), LONG_POLL_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+
+    if p.queue:
+        # only gone from the queue once it's actually been sent
+        body = p.clear()
+        return RequeueResponse(200, body, lambda: p.requeue(body))
     
     return DEFAULT_RESPONSE
 
@@ -146,10 +180,10 @@ async def bancho(request: Request) -> Response:
 )
 async def avatar(request: Request) -> Response:
     return await glob.handlers['avatar'](
-        int(request.args['userid'])
+        request, int(request.args['userid'])
     )
 
-DEFAULT_API_RESPONSE = Response(
+DEFAULT_API_RESPONSE = StaticResponse(
     code = 200,
     body = orjson.dumps({
         'status': 'failed',
@@ -176,6 +210,7 @@ async def website(request: Request) -> Response:
     ](request)
 
 import handlers # load all handlers
+glob.router = Router.from_dict(glob.handlers)
 
 if __name__ == '__main__':
     try:
@@ -185,8 +220,10 @@ if __name__ == '__main__':
         pass
 
     server.run(
-        bind = ('127.0.0.1', 5000),
-        listening = 16,
+        bind = getattr(config, 'bind', ('127.0.0.1', 5000)),
+        listening = getattr(config, 'backlog', 16),
         before_startup = on_start_up,
-        background_tasks = [while_server_running]
+        background_tasks = [while_server_running],
+        use_protocol = getattr(config, 'use_protocol', False),
+        after_shutdown = on_shut_down
     )
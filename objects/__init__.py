@@ -2,6 +2,10 @@ from .player import *
 from .beatmap import *
 from .file import File
 from .score import Score
+from .writer import Writer
+from .sessions import Sessions
+from .replays import ReplayStore
+from .storage import open_storage
 from .replay import Replay
 from .jsonfile import JsonFile
 from .leaderboard import Leaderboard
@@ -109,7 +109,7 @@ class Beatmap:
     def add_to_db(self) -> None:
         glob.beatmaps[self.file_md5] = self.as_dict()
         glob.beatmaps[str(self.beatmap_id)] = self.as_dict()
-        utils.update_files()
+        utils.files_changed()
     
     @classmethod
     def from_dict(cls, _dict: dict[str, Any]) -> 'Beatmap':
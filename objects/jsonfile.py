@@ -1,25 +1,215 @@
+import os
+import time
 import orjson
 from typing import Any
 from pathlib import Path
 from typing import Union
+from typing import Callable
+from typing import Optional
+from typing import TYPE_CHECKING
 from collections import UserDict
+from concurrent.futures import Future
+
+if TYPE_CHECKING:
+    from objects.writer import Writer
+
+# log size past which it's folded back into the snapshot
+COMPACT_SIZE = 4 * 1024 * 1024
+
+KEY = Union[str, int]
+PATH = tuple[KEY, ...]
 
 class JsonFile(UserDict):
-    def __init__(self, path: Union[str, Path]) -> None:
+    """A json snapshot plus an append only log of the changes made
+    since, `update_file` only appends what changed to the log.
+
+    Given a `Writer` the files are written on its thread, reads are
+    always served from memory.
+
+    Changes to nested values have to go through `set`/`append`/`delete`
+    (or `changed` after editing a value in place) to be logged,
+    top level assignments are logged on their own."""
+    def __init__(
+        self, path: Union[str, Path],
+        compact_size: int = COMPACT_SIZE,
+        writer: Optional['Writer'] = None
+    ) -> None:
         if isinstance(path, str):
             self.path = Path(path)
         else:
             self.path = path
 
+        self.log_path = self.path.with_name(f'{self.path.name}.log')
+        self.compact_size = compact_size
+        self.writer = writer
+        # bytes handed over to be logged since the last snapshot
+        self.log_size = 0
+        self.pending: list[bytes] = []
+        # set by every change, cleared once it's on disk
+        self.dirty = False
+        # set by the writer when an append failed, the log is
+        # replaced by a snapshot on the next update
+        self.broken = False
+
+        super().__init__()
         if not self.path.exists():
             self.path.write_bytes(b"{}")
-            super().__init__()
         else:
-            data = orjson.loads(self.path.read_bytes() or b"{}")
-            super().__init__(**data)
+            self.data = orjson.loads(self.path.read_bytes() or b"{}")
+
+        self.recover()
 
-    def __getitem__(self, key: Any) -> Any:        
+    def __getitem__(self, key: Any) -> Any:
         return self.data[key]
 
-    def update_file(self) -> None:
-        self.path.write_bytes(orjson.dumps(dict(self)))
\ No newline at end of file
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.data[key] = value
+        self.record('set', (key,), value)
+
+    def __delitem__(self, key: Any) -> None:
+        del self.data[key]
+        self.record('del', (key,))
+
+    @property
+    def base(self) -> list[int]:
+        # identifies the snapshot a log was started on top of
+        stat = self.path.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def record(self, op: str, path: PATH, value: Any = None) -> None:
+        self.pending.append(
+            orjson.dumps({'op': op, 'path': path, 'value': value}) + b'\n'
+        )
+        self.dirty = True
+
+    def walk(self, path: PATH) -> Any:
+        container = self.data
+        for key in path:
+            container = container[key]
+
+        return container
+
+    def apply(self, op: str, path: PATH, value: Any = None) -> None:
+        container = self.walk(path[:-1])
+        if op == 'set':
+            container[path[-1]] = value
+        elif op == 'append':
+            container[path[-1]].append(value)
+        elif op == 'del':
+            del container[path[-1]]
+
+    def set(self, path: PATH, value: Any) -> None:
+        self.apply('set', path, value)
+        self.record('set', path, value)
+
+    def append(self, path: PATH, value: Any) -> None:
+        self.apply('append', path, value)
+        self.record('append', path, value)
+
+    def delete(self, path: PATH) -> None:
+        self.apply('del', path)
+        self.record('del', path)
+
+    def changed(self, *path: KEY) -> None:
+        """Logs the current value at `path` after it was edited in place"""
+        self.record('set', path, self.walk(path))
+
+    def write(self, job: Callable, *args: Any) -> Optional[Future]:
+        if not self.writer:
+            return job(*args)
+
+        start = time.perf_counter()
+        future = self.writer.submit(job, *args)
+        self.writer.blocked_time += time.perf_counter() - start
+        return future
+
+    def update_file(self) -> Optional[Future]:
+        if not self.dirty:
+            return None
+
+        records, self.pending = self.pending, []
+        self.log_size += sum(len(record) for record in records)
+        self.dirty = False
+
+        if self.log_size > self.compact_size or self.broken:
+            return self.compact()
+
+        return self.write(self.append_log, records)
+
+    def compact(self) -> Optional[Future]:
+        """Folds the log into a new snapshot"""
+        # serialized here so the snapshot matches what's been logged
+        start = time.perf_counter()
+        data = orjson.dumps(self.data)
+        if self.writer:
+            self.writer.blocked_time += time.perf_counter() - start
+
+        self.log_size = 0
+        self.pending.clear()
+        self.dirty = self.broken = False
+        return self.write(self.replace_snapshot, data)
+
+    def append_log(self, records: list[bytes]) -> None:
+        data = b''.join(records)
+        # unbuffered, so nothing is left to be written after a failure
+        with self.log_path.open('ab', buffering = 0) as f:
+            start = f.seek(0, os.SEEK_END)
+            if not start:
+                data = orjson.dumps({'base': self.base}) + b'\n' + data
+
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[f.write(view):]
+
+                os.fsync(f.fileno())
+            except BaseException:
+                # a torn record can't be left for later ones to follow,
+                # these changes only get to disk with the next snapshot
+                f.truncate(start)
+                self.broken = self.dirty = True
+                raise
+
+    def replace_snapshot(self, data: bytes) -> None:
+        tmp = self.path.with_name(f'{self.path.name}.tmp')
+        with tmp.open('wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        tmp.replace(self.path)
+
+        # a log left behind by a crash here no longer matches
+        # the snapshot's base, so it's never replayed twice
+        self.log_path.unlink(missing_ok=True)
+
+        if os.name != 'nt':
+            # makes the rename itself durable
+            fd = os.open(self.path.parent, os.O_RDONLY)
+            try: os.fsync(fd)
+            finally: os.close(fd)
+
+    def recover(self) -> None:
+        """Replays a log left over from the last run"""
+        if not self.log_path.exists():
+            return
+
+        header, *records = self.log_path.read_bytes().split(b'\n')
+        try:
+            stale = orjson.loads(header)['base'] != self.base
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            stale = True
+
+        if stale:
+            self.log_path.unlink()
+            return
+
+        for record in records:
+            # a crash mid append cuts a record short, only that one is lost
+            try:
+                change = orjson.loads(record)
+                self.apply(change['op'], change['path'], change['value'])
+            except (orjson.JSONDecodeError, KeyError, IndexError, TypeError):
+                continue
+
+        self.compact()
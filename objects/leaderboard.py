@@ -2,11 +2,11 @@ import config
 from ext import glob
 from typing import Union
 from typing import Optional
+from typing import TYPE_CHECKING
 from objects.score import Score
 from objects.beatmap import Beatmap
 from objects.score import BanchoScore
 
-ONLINE_PLAYS = dict[str, list[dict]]
 OSU_API_BASE = 'https://osu.ppy.sh/api'
 
 status_to_db = {
@@ -55,6 +55,9 @@ SCORE_FORMAT = (
 )
 VALID_LB_STATUESES = (LOVED, QUALIFIED, RANKED, APPROVED)
 
+if TYPE_CHECKING:
+    from objects.player import Player
+
 SCORE = Union[Score, BanchoScore]
 class Leaderboard:
     def __init__(self) -> None:
@@ -120,7 +123,7 @@ class Leaderboard:
     
     @classmethod
     async def from_offline(
-        cls, filename: str, mods: int,
+        cls, player: 'Player', filename: str, mods: int,
         mode: int, rank_type: int,
         set_id: int, md5: str
     ) -> 'Leaderboard':
@@ -136,36 +139,14 @@ class Leaderboard:
         scores: list[Union[Score, BanchoScore]] = []
 
         lb.scores = scores
-        if (
-            not glob.player or 
-            not glob.current_profile
-        ):
-            return lb
 
-        key = 'qualified_plays'
-        
-        _player_scores: Optional[ONLINE_PLAYS] = \
-        glob.current_profile['plays'][key]
-        
-        if not _player_scores:
-            return lb
-        
-        if md5 not in _player_scores:
+        if not (play := glob.storage.best(
+            player.name, md5, 'qualified',
+            mods if rank_type == MODS else None, exact = False
+        )):
             return lb
 
-        player_scores = _player_scores[md5].copy()
-
-        player_scores.sort(key = lambda s: s['score'], reverse = True)
-
-        if rank_type == MODS:
-            player_scores = [x for x in player_scores if x['mods'] & mods]
-            if not player_scores:
-                return lb
-            
-            player_score = Score.from_dict(player_scores[0])
-        else:
-            player_score = Score.from_dict(player_scores[0])
-
+        player_score = Score.from_dict(play)
         lb.scores.append(player_score)
         lb.scores.sort(key = lambda s: int(s.score), reverse = True)
         
@@ -178,7 +159,7 @@ class Leaderboard:
 
     @classmethod
     async def from_bancho(
-        cls, filename: str, mods: int,
+        cls, player: 'Player', filename: str, mods: int,
         mode: int, rank_type: int,
         set_id: int, md5: str
     ) -> 'Leaderboard':
@@ -212,36 +193,14 @@ class Leaderboard:
             scores: list[SCORE] = []
 
         lb.scores = scores
-        if (
-            not glob.player or 
-            not glob.current_profile
-        ):
-            return lb
 
-        key = f'{status_to_db[bmap.approved]}_plays'
-        
-        _player_scores: Optional[ONLINE_PLAYS] = \
-        glob.current_profile['plays'][key]
-        
-        if not _player_scores:
-            return lb
-        
-        if md5 not in _player_scores:
+        if not (play := glob.storage.best(
+            player.name, md5, status_to_db[bmap.approved],
+            mods if rank_type == MODS else None
+        )):
             return lb
 
-        player_scores = _player_scores[md5]
-
-        player_scores.sort(key = lambda s: s['score'], reverse = True)
-
-        if rank_type == MODS:
-            player_scores = [x for x in player_scores if x['mods'] == mods]
-            if not player_scores:
-                return lb
-            
-            player_score = Score.from_dict(player_scores[0])
-        else:
-            player_score = Score.from_dict(player_scores[0])
-
+        player_score = Score.from_dict(play)
         lb.scores.append(player_score)
         lb.scores.sort(key = lambda s: int(s.score), reverse = True)
 
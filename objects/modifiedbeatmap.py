@@ -140,7 +140,7 @@ class ModifiedBeatmap:
             'original_bmap': bmap.as_dict()
         }
 
-        utils.update_files()
+        utils.files_changed()
 
         if return_modified:
             return ModifiedBeatmap.from_dict(
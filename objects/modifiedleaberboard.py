@@ -6,11 +6,14 @@ from pathlib import Path
 from typing import Union
 from typing import Optional
 from typing import TypedDict
+from typing import TYPE_CHECKING
 from objects.score import Score
 from objects.beatmap import Beatmap
 from objects.modifiedbeatmap import ModifiedBeatmap
 
-ONLINE_PLAYS = dict[str, list[dict]]
+if TYPE_CHECKING:
+    from objects.player import Player
+
 OSU_API_BASE = 'https://osu.ppy.sh/api'
 
 status_to_db = {
@@ -60,6 +63,7 @@ SCORE_FORMAT = (
 VALID_LB_STATUESES = (LOVED, QUALIFIED, RANKED, APPROVED)
 
 class Params(TypedDict):
+    player: 'Player'
     filename: str
     mods: int
     mode: int
@@ -235,34 +239,14 @@ class ModifiedLeaderboard:
         ranked_status = FROM_API_TO_SERVER_STATUS[bmap.approved]
         if ranked_status not in VALID_LB_STATUESES:
             return lb
-        
-        if (
-            not glob.player or 
-            not glob.current_profile
-        ):
-            return lb
-
-        key = f'{status_to_db[bmap.approved]}_plays'
-        
-        _player_scores: Optional[ONLINE_PLAYS] = \
-        glob.current_profile['plays'][key]
 
-        if not _player_scores:
+        player_scores = glob.storage.on_map(
+            params['player'].name, bmap.file_md5,
+            status_to_db[bmap.approved],
+            params['mods'] if params['rank_type'] == MODS else None
+        )
+        if not player_scores:
             return lb
-        
-        if bmap.file_md5 not in _player_scores:
-            return lb
-
-        player_scores = _player_scores[bmap.file_md5]
-        player_scores.sort(key = lambda s: s['score'], reverse = True)
-
-        if params['rank_type'] == MODS:
-            player_scores = [
-                x for x in player_scores if 
-                x['mods'] == params['mods']
-            ]
-            if not player_scores:
-                return lb
 
         lb.personal_score = Score.from_dict(player_scores[0])
         lb.scores = [Score.from_dict(x) for x in player_scores]
@@ -1,19 +1,29 @@
 import time
+import uuid
 import utils
+import asyncio
 import config
 import orjson
 import queries
 import packets
 from ext import glob
+from typing import Any
 from typing import Union
-from typing import Optional
 
 SCORES = list[dict]
-RANKED_PLAYS = dict[str, list[dict]]
-APPROVED_PLAYS = RANKED_PLAYS
 OSU_DAILY_API = 'https://osudaily.net/api'
 
+# everything `packets.userStats` and `packets.userPresence` encode
+STAT_FIELDS = frozenset((
+    'userid', 'name', 'action', 'info_text', 'map_md5', 'mods', 'mode',
+    'map_id', 'ranked_score', 'acc', 'playcount', 'total_score', 'rank',
+    'pp', 'utc_offset', 'country', 'location', 'bancho_privs'
+))
+
 class Player:
+    # bumped on every stat change, cached stat packets are keyed on it
+    version: int = 0
+
     def __init__(self, name: str, from_login: bool = False) -> None:
         self.name = name
         self.from_login = from_login
@@ -23,9 +33,17 @@ class Player:
         ):
             self.init_db()
         
+        # set whenever something gets queued, long polls wait on it
+        self.queue_event = asyncio.Event()
         self.queue = bytearray()
         self.login_time = time.time()
 
+        # the cho token its session is looked up by and
+        # the address it logged in from, see `Sessions`
+        self.token = str(uuid.uuid4())
+        self.client = ''
+        self.userid = glob.sessions.userid(name)
+
         self.rank: int = 9999999
         self.acc: float = 0.0
         self.playcount: int = 0 
@@ -36,7 +54,6 @@ class Player:
         # constants
         self.mode = 0
         self.mods = 0
-        self.userid = 2
         self.action = 0
         self.map_id = 0
         self.country = 0
@@ -46,10 +63,30 @@ class Player:
         self.location = (0.0, 0.0)
         self.bancho_privs = 63
     
+    def __setattr__(self, name: str, value: Any) -> None:
+        if (
+            name in STAT_FIELDS and
+            self.__dict__.get(name) != value
+        ):
+            self.__dict__['version'] = self.version + 1
+
+        self.__dict__[name] = value
+
+        # every `p.queue += ...` ends up here
+        if name == 'queue' and value:
+            self.queue_event.set()
+
     def clear(self) -> bytearray:
         _queue = self.queue.copy()
         self.queue.clear()
+        self.queue_event.clear()
         return _queue 
+
+    def requeue(self, data: bytearray) -> None:
+        """Puts packets `clear` took back in front of anything queued since"""
+        self.queue[:0] = data
+        if self.queue:
+            self.queue_event.set()
     
     def init_db(self) -> None:
         if (
@@ -67,8 +104,11 @@ class Player:
                 queries.init_profile(self.name)
             )
         
-        utils.update_files()
-        glob.current_profile = glob.profiles[self.name]
+        utils.files_changed()
+
+    @property
+    def profile(self) -> dict:
+        return glob.profiles[self.name]
 
     async def get_rank(self) -> int:
         if not config.osu_daily_api_key:
@@ -104,37 +144,21 @@ class Player:
         return json['rank']
     
     async def update(self) -> None:
-        scores: SCORES = []
-
-        if not glob.current_profile:
-            glob.current_profile = glob.profiles[self.name]
-
-        ranked_plays: Optional[RANKED_PLAYS] = \
-        glob.current_profile['plays']['ranked_plays']
-
-        approved_plays: Optional[APPROVED_PLAYS] = \
-        glob.current_profile['plays']['approved_plays']
-        
-        for plays in (ranked_plays, approved_plays):
-            if plays:
-                for v in plays.values():
-                    scores.extend(v)
-        
-        scores.sort(key = lambda s: s['pp'], reverse = True)
-        top_scores = utils.filter_top_scores(scores[:100])
-        top_scores.sort(key = lambda s: s['pp'], reverse = True)
+        profile = self.profile
+        top_scores: SCORES = glob.storage.top(self.name, 100)
+        play_count = glob.storage.count(self.name)
 
         pp = sum([s['pp'] * 0.95 ** i for i, s in enumerate(top_scores)])
-        pp += 416.6667 * (1 - (0.9994 ** len(scores)))
+        pp += 416.6667 * (1 - (0.9994 ** play_count))
         self.pp = round(pp)
 
         if top_scores:
             acc = sum([s['acc'] * 0.95 ** i for i, s in enumerate(top_scores)])
-            bonus_acc = 100.0 / (20 * (1 - 0.95 ** len(scores)))
+            bonus_acc = 100.0 / (20 * (1 - 0.95 ** play_count))
             self.acc = (acc * bonus_acc) / 100
         
-        if 'playcount' in glob.current_profile:
-            self.playcount = glob.current_profile['playcount']
+        if 'playcount' in profile:
+            self.playcount = profile['playcount']
         
         self.rank = await self.get_rank()
         
@@ -0,0 +1,126 @@
+import os
+import re
+import ast
+import utils
+import hashlib
+import binascii
+from utils import log
+from utils import Color
+from typing import Any
+from pathlib import Path
+from typing import Optional
+from typing import TYPE_CHECKING
+from objects.storage import STATUSES
+
+if TYPE_CHECKING:
+    from objects.writer import Writer
+    from objects.jsonfile import JsonFile
+
+MD5 = re.compile(r'[0-9a-f]{32}')
+
+def decode_frames(score: dict[str, Any]) -> Optional[bytes]:
+    """Replay frames embedded in a score dict, base64 or
+    (from older versions) the repr of the bytes"""
+    if not (frames := score.get('replay_frames')):
+        return None
+
+    if isinstance(frames, bytes):
+        return frames
+
+    if frames[:2] == "b'":
+        return ast.literal_eval(frames)
+
+    try:
+        return utils.string_to_bytes(frames)
+    except binascii.Error:
+        return None
+
+class ReplayStore:
+    """Replay frames as raw files named after the replay's md5,
+    scores only keep the `replay_md5` pointing at them"""
+    def __init__(self, folder: Path, writer: 'Writer') -> None:
+        self.folder = folder
+        self.folder.mkdir(exist_ok = True)
+        self.writer = writer
+        # so checking for a replay never touches the disk
+        self.stored = {
+            path.name for path in self.folder.iterdir()
+            if MD5.fullmatch(path.name)
+        }
+
+    def has(self, replay_md5: Optional[str]) -> bool:
+        return replay_md5 in self.stored
+
+    def path(self, replay_md5: Optional[str]) -> Optional[Path]:
+        if not self.has(replay_md5):
+            return None
+
+        return self.folder / replay_md5 # type: ignore
+
+    def save(
+        self, replay_md5: Optional[str], frames: Optional[bytes]
+    ) -> Optional[str]:
+        """Stores a replay and returns the md5 it's stored under, the
+        frames' own md5 when `replay_md5` can't be used as a key"""
+        if not frames:
+            return None
+
+        if not replay_md5 or not MD5.fullmatch(replay_md5):
+            replay_md5 = hashlib.md5(frames).hexdigest()
+
+        # the same md5 is the same replay, nothing to write
+        if replay_md5 not in self.stored:
+            self.stored.add(replay_md5)
+            self.writer.submit(self.write, replay_md5, frames)
+
+        return replay_md5
+
+    def write(self, replay_md5: str, frames: bytes) -> None:
+        path = self.folder / replay_md5
+        tmp = path.with_name(f'{replay_md5}.tmp')
+        with tmp.open('wb') as f:
+            f.write(frames)
+            f.flush()
+            os.fsync(f.fileno())
+
+        tmp.replace(path)
+
+    def move_out(self, score: dict[str, Any]) -> bool:
+        """Moves the frames embedded in a score dict into the store,
+        frames that can't be stored are left where they are"""
+        if 'replay_frames' not in score:
+            return False
+
+        replay_md5 = self.save(score.get('replay_md5'), decode_frames(score))
+        if not replay_md5:
+            return False
+
+        score['replay_md5'] = replay_md5
+        del score['replay_frames']
+        return True
+
+    def migrate(self, profiles: 'JsonFile') -> None:
+        """Moves the frames still embedded in `profiles.json` out"""
+        stored = len(self.stored)
+        moved = 0
+        for profile in profiles.values():
+            plays = profile['plays']
+            for scores in (
+                plays['all_plays'],
+                *(
+                    map_plays
+                    for status in STATUSES
+                    for map_plays in (plays[f'{status}_plays'] or {}).values()
+                )
+            ):
+                moved += sum(self.move_out(score) for score in scores)
+
+        if not moved:
+            return
+
+        # the writer puts the replays on disk before the new snapshot
+        profiles.compact()
+        log(
+            f'moved {len(self.stored) - stored} replays out of profiles.json',
+            color = Color.GREEN
+        )
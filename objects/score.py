@@ -82,15 +82,9 @@ class Score:
         score = self.__dict__.copy()
         del score['replay']
         del score['bmap']
+        # kept in `glob.replays` under the replay's md5
+        del score['replay_frames']
 
-        if (
-            self.replay_frames and 
-            isinstance(self.replay_frames, bytes)
-        ):
-            score['replay_frames'] = utils.bytes_to_string(
-                score['replay_frames']
-            )
-        
         return score
 
     @property
@@ -138,10 +132,7 @@ class Score:
 
     @classmethod
     def from_score_sub(cls) -> Optional['Score']:
-        if (
-            not glob.player or
-            not glob.replay_folder
-        ):
+        if not glob.replay_folder:
             return
         
         files = glob.replay_folder.glob('*.osr')
@@ -149,7 +140,7 @@ class Score:
         replay = Replay.from_file(str(replay_path))
         
         s = cls(
-            glob.player.mode, replay.beatmap_md5, replay.player_name, # type: ignore
+            int(replay.mode), replay.beatmap_md5, replay.player_name, # type: ignore
             replay.n300, replay.n100, replay.n50, replay.geki, # type: ignore
             replay.katu, replay.miss, replay.total_score, # type: ignore
             replay.combo, bool(replay.perfect), int(replay.mods), # type: ignore
@@ -162,7 +153,7 @@ class Score:
 
     @property
     def as_leaderboard_score(self) -> dict:
-        if self.scoreid and self.replay_frames:
+        if self.scoreid and glob.replays.has(self.replay_md5):
             sid = -self.scoreid
         else:
             sid = 0
@@ -180,7 +171,7 @@ class Score:
             'countgeki': self.ngeki,
             'perfect': int(self.perfect),
             'enabled_mods': self.mods,
-            'user_id': 2,
+            'user_id': glob.sessions.userid(self.name),
             'time': self.time,
             'replay_available': 1 if sid != 0 else 0
         }
\ No newline at end of file
@@ -0,0 +1,90 @@
+from typing import Iterator
+from typing import Optional
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from server import Request
+    from objects.player import Player
+
+# local players get ids past any real osu! user's, so they never
+# collide with the ids on bancho leaderboards (or their avatars)
+FIRST_USERID = 1_000_000_000
+
+class Sessions:
+    """Logged in players by cho token, requests that don't carry
+    the token are matched by name, then by the address they came from"""
+    def __init__(self) -> None:
+        self.tokens: dict[str, 'Player'] = {}
+        self.names: dict[str, 'Player'] = {}
+        self.clients: dict[str, 'Player'] = {}
+        # kept across logins, scores of players that aren't online use them too
+        self.userids: dict[str, int] = {}
+        self.userid_names: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __iter__(self) -> Iterator['Player']:
+        return iter(self.tokens.values())
+
+    def add(self, p: 'Player') -> None:
+        # logging in again replaces the old session
+        if (old := self.names.get(p.name)):
+            self.remove(old)
+
+        self.tokens[p.token] = p
+        self.names[p.name] = p
+        if p.client:
+            self.clients[p.client] = p
+
+    def remove(self, p: 'Player') -> None:
+        self.tokens.pop(p.token, None)
+
+        if self.names.get(p.name) is p:
+            del self.names[p.name]
+
+        if self.clients.get(p.client) is p:
+            del self.clients[p.client]
+
+    def userid(self, name: str) -> int:
+        """The user id of a profile, the same for as long as the server runs"""
+        if (userid := self.userids.get(name)) is None:
+            userid = self.userids[name] = FIRST_USERID + len(self.userids)
+            self.userid_names[userid] = name
+
+        return userid
+
+    def name_of(self, userid: int) -> Optional[str]:
+        return self.userid_names.get(userid)
+
+    def from_userid(self, userid: int) -> Optional['Player']:
+        if (name := self.userid_names.get(userid)) is None:
+            return None
+
+        return self.names.get(name)
+
+    def from_token(self, token: str) -> Optional['Player']:
+        return self.tokens.get(token)
+
+    def from_name(self, name: str) -> Optional['Player']:
+        return self.names.get(name)
+
+    def from_request(self, request: 'Request') -> Optional['Player']:
+        if (token := request.get_str('osu_token')):
+            return self.tokens.get(token)
+
+        # osu!'s web requests send the username as `us` or `u`
+        if (
+            (name := request.params.get_str('us') or request.params.get_str('u')) and
+            (p := self.names.get(name))
+        ):
+            return p
+
+        if (p := self.clients.get(request.client)):
+            return p
+
+        # with only one player around, every request is theirs
+        if len(self.tokens) == 1:
+            return next(iter(self.tokens.values()))
+
+        return None
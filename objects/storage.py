@@ -0,0 +1,385 @@
+import utils
+import orjson
+import queries
+import sqlite3
+from abc import ABC
+from ext import glob
+from utils import log
+from utils import Color
+from typing import Any
+from abc import abstractmethod
+from pathlib import Path
+from typing import Iterator
+from typing import Optional
+
+SCORE = dict[str, Any]
+STATUSES = ('ranked', 'approved', 'qualified', 'loved')
+# the plays pp and rank are calculated from
+RANKED = ('ranked', 'approved')
+
+class Storage(ABC):
+    """Where submitted scores live, everything asking for a profile's
+    plays goes through here instead of scanning `glob.profiles`"""
+    @abstractmethod
+    def add(self, name: str, score: SCORE, status: str) -> int:
+        """Stores a new score and returns its id"""
+        ...
+
+    @abstractmethod
+    def has_replay(self, name: str, replay_md5: str) -> bool:
+        ...
+
+    @abstractmethod
+    def get(self, name: str, scoreid: int) -> Optional[SCORE]:
+        ...
+
+    @abstractmethod
+    def count(self, name: str, statuses: tuple[str, ...] = RANKED) -> int:
+        ...
+
+    @abstractmethod
+    def top(
+        self, name: str, limit: int,
+        statuses: tuple[str, ...] = RANKED
+    ) -> list[SCORE]:
+        """Best scores by pp, one per map"""
+        ...
+
+    @abstractmethod
+    def recent(self, name: str, limit: int) -> list[SCORE]:
+        ...
+
+    @abstractmethod
+    def on_map(
+        self, name: str, md5: str, status: str,
+        mods: Optional[int] = None, exact: bool = True,
+        limit: Optional[int] = None
+    ) -> list[SCORE]:
+        """Plays on a map by score, `exact` means mods have
+        to match, otherwise they only have to overlap"""
+        ...
+
+    def best(
+        self, name: str, md5: str, status: str,
+        mods: Optional[int] = None, exact: bool = True
+    ) -> Optional[SCORE]:
+        scores = self.on_map(name, md5, status, mods, exact, limit = 1)
+        return scores[0] if scores else None
+
+    @abstractmethod
+    def scores(
+        self, name: str,
+        statuses: tuple[str, ...] = RANKED
+    ) -> Iterator[SCORE]:
+        ...
+
+    @abstractmethod
+    def update(self, name: str, scores: list[tuple[SCORE, SCORE]]) -> None:
+        """Replaces each (old, new) pair of scores"""
+        ...
+
+    @abstractmethod
+    def wipe(self, name: str) -> None:
+        ...
+
+class JsonStorage(Storage):
+    """Scores kept inside the profiles in `profiles.json`"""
+    def plays(self, name: str) -> dict[str, Any]:
+        return glob.profiles[name]['plays']
+
+    def add(self, name: str, score: SCORE, status: str) -> int:
+        plays = self.plays(name)
+        score['scoreid'] = scoreid = len(plays['all_plays']) + 1
+        glob.profiles.append((name, 'plays', 'all_plays'), score)
+
+        key = f'{status}_plays'
+        if score['md5'] not in plays[key]:
+            glob.profiles.set((name, 'plays', key, score['md5']), [score])
+        else:
+            glob.profiles.append((name, 'plays', key, score['md5']), score)
+
+        if score.get('replay_md5'):
+            glob.profiles.append(
+                (name, 'plays', 'replay_md5'), score['replay_md5']
+            )
+
+        return scoreid
+
+    def has_replay(self, name: str, replay_md5: str) -> bool:
+        return replay_md5 in self.plays(name)['replay_md5']
+
+    def get(self, name: str, scoreid: int) -> Optional[SCORE]:
+        all_plays = self.plays(name)['all_plays']
+        if not 0 < scoreid <= len(all_plays):
+            return None
+
+        return all_plays[scoreid - 1]
+
+    def count(self, name: str, statuses: tuple[str, ...] = RANKED) -> int:
+        return sum(1 for _ in self.scores(name, statuses))
+
+    def top(
+        self, name: str, limit: int,
+        statuses: tuple[str, ...] = RANKED
+    ) -> list[SCORE]:
+        scores = sorted(
+            self.scores(name, statuses),
+            key = lambda s: s['pp'], reverse = True
+        )
+        return utils.filter_top_scores(scores[:limit])
+
+    def recent(self, name: str, limit: int) -> list[SCORE]:
+        return sorted(
+            self.plays(name)['all_plays'],
+            key = lambda s: s.get('time', 0), reverse = True
+        )[:limit]
+
+    def on_map(
+        self, name: str, md5: str, status: str,
+        mods: Optional[int] = None, exact: bool = True,
+        limit: Optional[int] = None
+    ) -> list[SCORE]:
+        scores = (self.plays(name)[f'{status}_plays'] or {}).get(md5) or []
+        if mods is not None:
+            scores = [
+                s for s in scores if
+                (s['mods'] == mods if exact else s['mods'] & mods)
+            ]
+
+        return sorted(
+            scores, key = lambda s: s['score'], reverse = True
+        )[:limit]
+
+    def scores(
+        self, name: str,
+        statuses: tuple[str, ...] = RANKED
+    ) -> Iterator[SCORE]:
+        plays = self.plays(name)
+        for status in statuses:
+            for map_plays in (plays[f'{status}_plays'] or {}).values():
+                yield from map_plays
+
+    def update(self, name: str, scores: list[tuple[SCORE, SCORE]]) -> None:
+        new = {id(old): score for old, score in scores}
+        plays = self.plays(name)
+
+        for key in ('all_plays', *(f'{status}_plays' for status in STATUSES)):
+            lists = [plays[key]] if key == 'all_plays' else plays[key].values()
+            for map_plays in lists:
+                for idx, score in enumerate(map_plays):
+                    if id(score) in new:
+                        map_plays[idx] = new[id(score)]
+
+        glob.profiles.changed(name, 'plays')
+
+    def wipe(self, name: str) -> None:
+        plays = queries.init_profile(name)[name]['plays']
+        glob.profiles.set((name, 'plays'), plays)
+
+class SQLiteStorage(Storage):
+    """Scores as rows in a sqlite database, indexed by map,
+    pp and time so nothing has to scan a whole profile"""
+    SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS scores (
+        profile TEXT NOT NULL,
+        scoreid INTEGER NOT NULL,
+        md5 TEXT NOT NULL,
+        status TEXT NOT NULL,
+        replay_md5 TEXT,
+        pp REAL NOT NULL DEFAULT 0,
+        score INTEGER NOT NULL DEFAULT 0,
+        mods INTEGER NOT NULL DEFAULT 0,
+        time INTEGER NOT NULL DEFAULT 0,
+        data BLOB NOT NULL,
+        PRIMARY KEY (profile, scoreid)
+    );
+    CREATE INDEX IF NOT EXISTS scores_md5 ON scores (profile, md5, status);
+    CREATE INDEX IF NOT EXISTS scores_pp ON scores (profile, pp DESC);
+    CREATE INDEX IF NOT EXISTS scores_time ON scores (profile, time DESC);
+    CREATE INDEX IF NOT EXISTS scores_replay ON scores (profile, replay_md5);
+    CREATE INDEX IF NOT EXISTS scores_status ON scores (profile, status);
+    '''
+
+    def __init__(self, path: Path) -> None:
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(self.SCHEMA)
+
+        # scores are imported from `profiles.json` the first time only
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if not version:
+            self.import_json()
+
+        if version < 2:
+            self.move_replays()
+
+    def row(self, name: str, score: SCORE, status: str) -> tuple:
+        return (
+            name, score['scoreid'], score['md5'], status,
+            score.get('replay_md5'), score.get('pp') or 0,
+            int(score.get('score') or 0), score.get('mods') or 0,
+            score.get('time') or 0, orjson.dumps(score)
+        )
+
+    @staticmethod
+    def play_key(score: SCORE) -> Any:
+        return score.get('replay_md5') or score.get('time')
+
+    def import_json(self) -> None:
+        rows = []
+        for name, profile in glob.profiles.items():
+            plays = profile['plays']
+            # ids are the score's place in `all_plays`, like they were
+            ids: dict[Any, list[int]] = {}
+            for idx, score in enumerate(plays['all_plays']):
+                ids.setdefault(self.play_key(score), []).append(idx + 1)
+
+            # `all_plays` isn't touched by recalcs, the status
+            # lists hold the current pp so the rows come from them
+            unmatched = len(plays['all_plays'])
+            for status in STATUSES:
+                for map_plays in (plays[f'{status}_plays'] or {}).values():
+                    for score in map_plays:
+                        if not (scoreids := ids.get(self.play_key(score))):
+                            unmatched += 1
+                            scoreids = [unmatched]
+
+                        score = score | {'scoreid': scoreids.pop(0)}
+                        rows.append(self.row(name, score, status))
+
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO scores VALUES (?,?,?,?,?,?,?,?,?,?)', rows
+            )
+            self.db.execute('PRAGMA user_version = 1')
+
+        log(f'imported {len(rows)} scores into sqlite', color = Color.GREEN)
+
+    def move_replays(self) -> None:
+        """Moves replay frames imported along with the scores into `glob.replays`"""
+        rows = []
+        for name, scoreid, data in self.db.execute(
+            'SELECT profile, scoreid, data FROM scores'
+        ):
+            score = orjson.loads(data)
+            if glob.replays.move_out(score):
+                rows.append((
+                    orjson.dumps(score), score['replay_md5'], name, scoreid
+                ))
+
+        # the replays are on disk before the scores stop holding them
+        glob.replays.writer.sync().result()
+        with self.db:
+            self.db.executemany(
+                'UPDATE scores SET data = ?, replay_md5 = ? '
+                'WHERE profile = ? AND scoreid = ?', rows
+            )
+            self.db.execute('PRAGMA user_version = 2')
+
+        if rows:
+            self.db.execute('VACUUM')
+
+    def select(self, query: str, *args: Any) -> list[SCORE]:
+        return [
+            orjson.loads(data) for data, in
+            self.db.execute(f'SELECT data FROM scores {query}', args)
+        ]
+
+    def add(self, name: str, score: SCORE, status: str) -> int:
+        with self.db:
+            scoreid, = self.db.execute(
+                'SELECT COALESCE(MAX(scoreid), 0) + 1 FROM scores WHERE profile = ?',
+                (name,)
+            ).fetchone()
+
+            score['scoreid'] = scoreid
+            self.db.execute(
+                'INSERT INTO scores VALUES (?,?,?,?,?,?,?,?,?,?)',
+                self.row(name, score, status)
+            )
+
+        return scoreid
+
+    def has_replay(self, name: str, replay_md5: str) -> bool:
+        return self.db.execute(
+            'SELECT 1 FROM scores WHERE profile = ? AND replay_md5 = ?',
+            (name, replay_md5)
+        ).fetchone() is not None
+
+    def get(self, name: str, scoreid: int) -> Optional[SCORE]:
+        scores = self.select('WHERE profile = ? AND scoreid = ?', name, scoreid)
+        return scores[0] if scores else None
+
+    def count(self, name: str, statuses: tuple[str, ...] = RANKED) -> int:
+        return self.db.execute(
+            'SELECT COUNT(*) FROM scores WHERE profile = ? AND '
+            f"status IN ({','.join('?' * len(statuses))})",
+            (name, *statuses)
+        ).fetchone()[0]
+
+    def top(
+        self, name: str, limit: int,
+        statuses: tuple[str, ...] = RANKED
+    ) -> list[SCORE]:
+        return utils.filter_top_scores(self.select(
+            'WHERE profile = ? AND '
+            f"status IN ({','.join('?' * len(statuses))}) "
+            'ORDER BY pp DESC LIMIT ?',
+            name, *statuses, limit
+        ))
+
+    def recent(self, name: str, limit: int) -> list[SCORE]:
+        return self.select(
+            'WHERE profile = ? ORDER BY time DESC LIMIT ?', name, limit
+        )
+
+    def on_map(
+        self, name: str, md5: str, status: str,
+        mods: Optional[int] = None, exact: bool = True,
+        limit: Optional[int] = None
+    ) -> list[SCORE]:
+        query = 'WHERE profile = ? AND md5 = ? AND status = ?'
+        args: list[Any] = [name, md5, status]
+        if mods is not None:
+            query += ' AND mods = ?' if exact else ' AND mods & ? != 0'
+            args.append(mods)
+
+        # a negative limit is no limit to sqlite
+        return self.select(
+            f'{query} ORDER BY score DESC LIMIT ?',
+            *args, -1 if limit is None else limit
+        )
+
+    def scores(
+        self, name: str,
+        statuses: tuple[str, ...] = RANKED
+    ) -> Iterator[SCORE]:
+        yield from self.select(
+            'WHERE profile = ? AND '
+            f"status IN ({','.join('?' * len(statuses))})",
+            name, *statuses
+        )
+
+    def update(self, name: str, scores: list[tuple[SCORE, SCORE]]) -> None:
+        with self.db:
+            self.db.executemany(
+                'UPDATE scores SET pp = ?, score = ?, data = ? '
+                'WHERE profile = ? AND scoreid = ?',
+                [
+                    (
+                        new.get('pp') or 0, int(new.get('score') or 0),
+                        orjson.dumps(new), name, old['scoreid']
+                    ) for old, new in scores
+                ]
+            )
+
+    def wipe(self, name: str) -> None:
+        with self.db:
+            self.db.execute('DELETE FROM scores WHERE profile = ?', (name,))
+
+def open_storage(kind: str, data_folder: Path) -> Storage:
+    if kind == 'sqlite':
+        return SQLiteStorage(data_folder / 'scores.db')
+
+    return JsonStorage()
@@ -0,0 +1,39 @@
+import time
+from utils import log
+from utils import Color
+from typing import Any
+from typing import Callable
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+
+class Writer:
+    """Runs file writes one after another on a thread of
+    its own, so the event loop never waits on the disk"""
+    def __init__(self) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers = 1, thread_name_prefix = 'writer'
+        )
+        # seconds spent writing on the writer thread, and seconds
+        # the event loop was held up handing writes over to it
+        self.write_time = 0.0
+        self.blocked_time = 0.0
+
+    def submit(self, job: Callable, *args: Any) -> Future:
+        return self.executor.submit(self.run, job, *args)
+
+    def run(self, job: Callable, *args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return job(*args)
+        except Exception as e:
+            log(f'writing failed: {e}', color = Color.RED)
+            raise
+        finally:
+            self.write_time += time.perf_counter() - start
+
+    def sync(self) -> Future:
+        """Done once everything submitted before it is written"""
+        return self.submit(lambda: None)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait = True)
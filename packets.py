@@ -1,7 +1,17 @@
 import enum
 import struct
+import weakref
 import functools
-from objects import Player
+from utils import log
+from utils import Color
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import Iterator
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from objects import Player
 
 @enum.unique
 class PacketIDS(enum.IntEnum):
@@ -114,6 +124,26 @@ class PacketIDS(enum.IntEnum):
     OSU_TOURNAMENT_JOIN_MATCH_CHANNEL = 108
     OSU_TOURNAMENT_LEAVE_MATCH_CHANNEL = 109
 
+PACKET_HEADER = struct.Struct('<HxI')
+INT = struct.Struct('<i')
+UNINT = struct.Struct('<I')
+SHORT = struct.Struct('<h')
+BYTE = struct.Struct('<b')
+UNBYTE = struct.Struct('<B')
+FLOAT = struct.Struct('<f')
+LONG = struct.Struct('<q')
+
+# struct format of every fixed width type `write` knows about
+FIXED_TYPES = {
+    'int': 'i',
+    'unint': 'I',
+    'short': 'h',
+    'float': 'f',
+    'long': 'q',
+    'byte': 'b',
+    'unbyte': 'B'
+}
+
 def write_uleb128(num: int) -> bytes:
     if num == 0:
         return bytearray(b'\x00')
@@ -163,143 +193,327 @@ def write_list32(l: tuple[int]) -> bytes:
 
     return bytes(ret)
 
+# uleb128 of every length that fits in a single byte
+ULEB128 = tuple(bytes((i,)) for i in range(0x80))
+MAX_LAYOUTS = 256
+
+class Packet:
+    """A packet compiled once into a struct layout, strings and lists
+    only change the counts in it so each packet is sized up front and
+    packed into one buffer by a single `struct.Struct`"""
+    STR = 0
+    LIST32 = 1
+
+    __slots__ = ('packetid', 'kinds', 'variable', 'fixed', 'layouts')
+
+    def __init__(self, packetid: int, *types: str) -> None:
+        self.packetid = packetid
+        self.kinds = tuple(
+            self.STR if _type == 'str' else
+            self.LIST32 if _type == 'list_32' else
+            FIXED_TYPES.get(_type, _type)
+            for _type in types
+        )
+        self.variable = tuple(
+            (idx, kind) for idx, kind in reversed(tuple(enumerate(self.kinds)))
+            if not isinstance(kind, str)
+        )
+
+        # packets without strings or lists only ever have one layout
+        self.fixed: Optional[struct.Struct] = None
+        if not self.variable:
+            self.fixed = struct.Struct(f"<HxI{''.join(self.kinds)}") # type: ignore
+
+        # variable lengths -> compiled layout
+        self.layouts: dict[tuple[int, ...], struct.Struct] = {}
+
+    def layout(self, lengths: tuple[int, ...]) -> struct.Struct:
+        fmt = '<HxI'
+        # lengths are collected last field first
+        lens = iter(reversed(lengths))
+        for kind in self.kinds:
+            if kind == self.STR:
+                fmt += f'B{next(lens)}s{next(lens)}s'
+            elif kind == self.LIST32:
+                fmt += f'h{next(lens)}i'
+            else:
+                fmt += kind # type: ignore
+
+        if len(self.layouts) >= MAX_LAYOUTS:
+            self.layouts.clear()
+
+        layout = self.layouts[lengths] = struct.Struct(fmt)
+        return layout
+
+    def __call__(self, *args: Any) -> bytes:
+        if self.fixed is not None:
+            return self.fixed.pack(
+                self.packetid, self.fixed.size - PACKET_HEADER.size, *args
+            )
+
+        values = list(args)
+        lengths: list[int] = []
+        # walked backwards so splicing doesn't shift the fields still to do
+        for idx, kind in self.variable:
+            arg = args[idx]
+            if kind == self.STR:
+                string = arg.encode()
+                length = len(string)
+                uleb = ULEB128[length] if length < 0x80 else write_uleb128(length)
+                lengths += (length, len(uleb))
+                values[idx:idx + 1] = (0x0b, uleb, string)
+            else:
+                lengths.append(len(arg))
+                values[idx:idx + 1] = (len(arg), *arg)
+
+        key = tuple(lengths)
+        if (layout := self.layouts.get(key)) is None:
+            layout = self.layout(key)
+
+        return layout.pack(
+            self.packetid, layout.size - PACKET_HEADER.size, *values
+        )
+
+schemas: dict[tuple, Packet] = {}
+
 def write(packetid: int, *args) -> bytes:
-    p = bytearray(struct.pack('<Hx', packetid))
-
-    for ctx, _type in args:
-        if _type == 'str':
-            p += write_string(ctx)
-        elif _type == 'int':
-            p += write_int(ctx)
-        elif _type == 'unint':
-            p += write_unsigned_int(ctx)
-        elif _type == 'short':
-            p += write_short(ctx)
-        elif _type == 'float':
-            p += write_float(ctx)
-        elif _type == 'long':
-            p += write_long_long(ctx)
-        elif _type == 'byte':
-            p += write_byte(ctx)
-        elif _type == 'unbyte':
-            p += write_unsigned_byte(ctx)
-        elif _type == 'list_32':
-            p += write_list32(ctx)
-        else:
-            p += struct.pack(f'<{_type}', ctx)
-    
-    p[3:3] = struct.pack('<I', len(p) - 3)
-    return bytes(p)
-
-@functools.cache
+    types = tuple(_type for _, _type in args)
+    if (schema := schemas.get((packetid, types))) is None:
+        schema = schemas[(packetid, types)] = Packet(packetid, *types)
+
+    return schema(*[ctx for ctx, _ in args])
+
+USER_ID = Packet(PacketIDS.CHO_USER_ID, 'int')
+USER_ID_UNSIGNED = Packet(PacketIDS.CHO_USER_ID, 'unint')
+NOTIFICATION = Packet(PacketIDS.CHO_NOTIFICATION, 'str')
+PROTOCOL_VERSION = Packet(PacketIDS.CHO_PROTOCOL_VERSION, 'int')
+PRIVILEGES = Packet(PacketIDS.CHO_PRIVILEGES, 'int')
+USER_PRESENCE = Packet(
+    PacketIDS.CHO_USER_PRESENCE,
+    'int', 'str', 'unbyte', 'unbyte', 'unbyte', 'float', 'float', 'int'
+)
+USER_STATS = Packet(
+    PacketIDS.CHO_USER_STATS,
+    'int', 'byte', 'str', 'str', 'int', 'unbyte', 'int',
+    'long', 'float', 'int', 'long', 'int', 'short'
+)
+MAIN_MENU_ICON = Packet(PacketIDS.CHO_MAIN_MENU_ICON, 'str')
+FRIENDS_LIST = Packet(PacketIDS.CHO_FRIENDS_LIST, 'list_32')
+CHANNEL_INFO_END = Packet(PacketIDS.CHO_CHANNEL_INFO_END)
+CHANNEL_JOIN_SUCCESS = Packet(PacketIDS.CHO_CHANNEL_JOIN_SUCCESS, 'str')
+CHANNEL_INFO = Packet(PacketIDS.CHO_CHANNEL_INFO, 'str', 'str', 'short')
+RESTART = Packet(PacketIDS.CHO_RESTART, 'int')
+USER_LOGOUT = Packet(PacketIDS.CHO_USER_LOGOUT, 'int', 'unbyte')
+SEND_MESSAGE = Packet(PacketIDS.CHO_SEND_MESSAGE, 'str', 'str', 'str', 'int')
+USER_SILENCED = Packet(PacketIDS.CHO_USER_SILENCED, 'int')
+
+PACKET_CACHE_SIZE = 256
+
+def player_cache(func: Callable[['Player'], bytes]) -> Callable[['Player'], bytes]:
+    """Caches a player's packet until their version changes,
+    players are weakly referenced so logging out frees them"""
+    cache: weakref.WeakKeyDictionary['Player', tuple[int, bytes]] = \
+    weakref.WeakKeyDictionary()
+
+    @functools.wraps(func)
+    def wrapper(p: 'Player') -> bytes:
+        if (
+            (cached := cache.get(p)) and
+            cached[0] == p.version
+        ):
+            return cached[1]
+
+        packet = func(p)
+        cache[p] = (p.version, packet)
+        return packet
+
+    return wrapper
+
+@functools.lru_cache(maxsize = PACKET_CACHE_SIZE)
 def userID(i: int) -> bytes:
-    return write(
-        PacketIDS.CHO_USER_ID,
-        (i, f"{'unint' if i > 0 else 'int'}")
-    )
+    return (USER_ID_UNSIGNED if i > 0 else USER_ID)(i)
 
-@functools.cache
+@functools.lru_cache(maxsize = PACKET_CACHE_SIZE)
 def notification(msg: str) -> bytes:
-    return write(
-        PacketIDS.CHO_NOTIFICATION,
-        (msg, 'str')
-    )
+    return NOTIFICATION(msg)
 
-@functools.cache
+@functools.lru_cache(maxsize = PACKET_CACHE_SIZE)
 def protocolVersion(i: int = 19):
-    return write(
-        PacketIDS.CHO_PROTOCOL_VERSION, (i, 'int')
-    )
+    return PROTOCOL_VERSION(i)
 
-@functools.cache
+@player_cache
 def banchoPrivs(p: 'Player') -> bytes:
-    return write(
-        PacketIDS.CHO_PRIVILEGES, (p.bancho_privs, 'int')
-    )
+    return PRIVILEGES(p.bancho_privs)
 
+@player_cache
 def userPresence(p: 'Player') -> bytes:
-    return write(
-        PacketIDS.CHO_USER_PRESENCE,
-        (p.userid, 'int'), (p.name, 'str'),
-        (p.utc_offset + 24, 'unbyte'), (p.country, 'unbyte'),
-        (p.bancho_privs | p.mode << 5, 'unbyte'), (p.location[0], 'float'),
-        (p.location[1], 'float'), (p.rank, 'int')
+    return USER_PRESENCE(
+        p.userid, p.name,
+        p.utc_offset + 24, p.country,
+        p.bancho_privs | p.mode << 5, p.location[0],
+        p.location[1], p.rank
     )
 
+@player_cache
 def userStats(p: 'Player') -> bytes:
-    return write(
-        PacketIDS.CHO_USER_STATS, 
-        (p.userid, 'int'), (p.action, 'byte'),
-        (p.info_text, 'str'), (p.map_md5, 'str'),
-        (p.mods, 'int'), (p.mode, 'unbyte'),
-        (p.map_id, 'int'), (p.ranked_score, 'long'),
-        (p.acc / 100.0, 'float'), (p.playcount, 'int'),
-        (p.total_score, 'long'), (p.rank, 'int'),
-        (p.pp, 'short')
+    return USER_STATS(
+        p.userid, p.action,
+        p.info_text, p.map_md5,
+        p.mods, p.mode,
+        p.map_id, p.ranked_score,
+        p.acc / 100.0, p.playcount,
+        p.total_score, p.rank,
+        p.pp
     )
 
-@functools.cache
+@functools.lru_cache(maxsize = PACKET_CACHE_SIZE)
 def menuIcon(menu_icon: tuple[str, str]) -> bytes:
-    return write(
-        PacketIDS.CHO_MAIN_MENU_ICON,
-        ('|'.join(menu_icon), 'str')
-    )
+    return MAIN_MENU_ICON('|'.join(menu_icon))
 
 def friendsList(*friends: int) -> bytes:
-    return write(
-        PacketIDS.CHO_FRIENDS_LIST,
-        (friends, 'list_32')
-    )
+    return FRIENDS_LIST(friends)
 
-@functools.cache
+@functools.lru_cache(maxsize = PACKET_CACHE_SIZE)
 def channelInfoEnd() -> bytes:
-    return write(PacketIDS.CHO_CHANNEL_INFO_END)
+    return CHANNEL_INFO_END()
 
 def channelJoin(channel_name: str) -> bytes:
-    return write(
-        PacketIDS.CHO_CHANNEL_JOIN_SUCCESS, (channel_name, 'str')
-    )
+    return CHANNEL_JOIN_SUCCESS(channel_name)
 
 def channelInfo(
     channel_name: str, 
     channel_description: str,
     channel_player_count: int
 ) -> bytes:
-    return write(
-        PacketIDS.CHO_CHANNEL_INFO, 
-        (channel_name, 'str'), (channel_description, 'str'), (channel_player_count, 'short')
+    return CHANNEL_INFO(
+        channel_name, channel_description, channel_player_count
     )
 
 def friendslist(*friends) -> bytes:
-    return write(
-        PacketIDS.CHO_FRIENDS_LIST,
-        (friends, 'list_32')
-    )
+    return FRIENDS_LIST(friends)
 
-@functools.cache
+@functools.lru_cache(maxsize = PACKET_CACHE_SIZE)
 def systemRestart(ms: int = 0) -> bytes:
-    return write(
-        PacketIDS.CHO_RESTART, (ms, 'int')
-    )
+    return RESTART(ms)
 
-@functools.cache
+@functools.lru_cache(maxsize = PACKET_CACHE_SIZE)
 def logout(uid: int) -> bytes:
-    return write(
-        PacketIDS.CHO_USER_LOGOUT,
-        (uid, 'int'), (0, 'unbyte')
-    )
+    return USER_LOGOUT(uid, 0)
 
-@functools.cache
+@functools.lru_cache(maxsize = PACKET_CACHE_SIZE)
 def sendMsg(client: str, msg: str, target: str, userid: int):
-    return write(
-        PacketIDS.CHO_SEND_MESSAGE, 
-        (client, 'str'), (msg, 'str'),
-        (target, 'str'), (userid, 'int') 
-    )
+    return SEND_MESSAGE(client, msg, target, userid)
 
-@functools.cache
+@functools.lru_cache(maxsize = PACKET_CACHE_SIZE)
 def userSilenced(userid: int) -> bytes:
-    return write(
-        PacketIDS.CHO_USER_SILENCED, 
-        (userid, 'int')
-    )
\ No newline at end of file
+    return USER_SILENCED(userid)
+
+class PacketReader:
+    """Walks the packets in a bancho request body, fields are read in
+    place through a view of the current packet and never copied out,
+    reading past the packet raises instead of reading into the next"""
+    def __init__(self, data: bytes) -> None:
+        self.data = memoryview(data)
+        self.view = self.data[:0]
+        self.offset = 0
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        data = self.data
+        offset = 0
+        while offset + PACKET_HEADER.size <= len(data):
+            packetid, length = PACKET_HEADER.unpack_from(data, offset)
+            offset += PACKET_HEADER.size
+
+            if offset + length > len(data): # truncated packet
+                return
+
+            self.view = data[offset:offset + length]
+            self.offset = 0
+            yield packetid, length
+
+            # anything a handler didn't read is skipped
+            offset += length
+
+    def read(self, fmt: struct.Struct) -> Any:
+        val, = fmt.unpack_from(self.view, self.offset)
+        self.offset += fmt.size
+        return val
+
+    def read_int(self) -> int:
+        return self.read(INT)
+
+    def read_unsigned_int(self) -> int:
+        return self.read(UNINT)
+
+    def read_short(self) -> int:
+        return self.read(SHORT)
+
+    def read_byte(self) -> int:
+        return self.read(BYTE)
+
+    def read_unsigned_byte(self) -> int:
+        return self.read(UNBYTE)
+
+    def read_float(self) -> float:
+        return self.read(FLOAT)
+
+    def read_long_long(self) -> int:
+        return self.read(LONG)
+
+    def read_uleb128(self) -> int:
+        val = shift = 0
+
+        while True:
+            b = self.view[self.offset]
+            self.offset += 1
+
+            val |= ((b & 0b01111111) << shift)
+            if (b & 0b10000000) == 0:
+                break
+
+            shift += 7
+
+        return val
+
+    def read_string(self) -> str:
+        if self.read_unsigned_byte() != 0x0b:
+            return ''
+
+        length = self.read_uleb128()
+        if self.offset + length > len(self.view):
+            raise ValueError('string runs past the packet')
+
+        string = str(self.view[self.offset:self.offset + length], 'utf-8', 'replace')
+        self.offset += length
+        return string
+
+    def read_list32(self) -> list[int]:
+        length = self.read_short()
+        items = list(struct.unpack_from(f'<{length}i', self.view, self.offset))
+        self.offset += length * 4
+        return items
+
+PACKET_HANDLER = Callable[['Player', PacketReader], Any]
+handlers: dict[int, PACKET_HANDLER] = {}
+
+def register(packetid: PacketIDS) -> Callable:
+    def inner(func: PACKET_HANDLER) -> PACKET_HANDLER:
+        handlers[packetid] = func
+        return func
+    return inner
+
+async def handle(p: 'Player', data: bytes) -> None:
+    """Dispatches every packet in a bancho request body to its handler"""
+    reader = PacketReader(data)
+    for packetid, _ in reader:
+        if not (func := handlers.get(packetid)):
+            continue
+
+        # a malformed packet only loses itself, not the rest of the body
+        try:
+            await func(p, reader)
+        except (struct.error, IndexError, ValueError) as e:
+            log(
+                f'malformed packet {packetid} from {p.name}: {e}',
+                color = Color.RED
+            )
@@ -36,6 +36,39 @@ menu_icon: dict[str, Optional[str]] = {
 }
 
 """Server Config"""
+# address and port the server listens on
+bind: tuple[str, int] = ('127.0.0.1', 5000)
+
+# how many connections the os queues up before accepting them
+backlog: int = 16
+
+# serve connections through asyncio's transports instead of
+# raw socket calls, usually faster when uvloop is installed
+use_protocol: bool = False
+
+# gzip/deflate level (1-9) for api responses, higher is smaller but slower
+compression_level: int = 6
+
+# connections served at once, extra ones wait in line for a slot
+max_connections: int = 256
+
+# seconds an idle kept-alive connection stays open
+keep_alive_timeout: float = 15.0
+
+# seconds a bancho poll is held open waiting for packets, so
+# notifications show up right away instead of on the next poll
+# the client can't send anything while its poll is held, keep it short
+# 0 answers polls right away like before
+long_poll_timeout: float = 0
+
+# where scores are kept, 'json' (inside profiles.json) or 'sqlite'
+# (.data/scores.db), switching to sqlite imports the json scores once
+storage: str = 'json'
+
+# seconds changes to the .data files are held before they're written,
+# everything changed in that time is written at once
+flush_interval: float = 1.0
+
 # needed for loading leaderboards
 # you can find your's here https://old.ppy.sh/p/api
 # if `None` then leaderboards won't load nor score submission
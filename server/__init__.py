@@ -1 +1,4 @@
-from .server import *
\ No newline at end of file
+from .server import *
+from .metrics import *
+from .multipart import *
+from .compression import *
\ No newline at end of file
@@ -0,0 +1,102 @@
+import zlib
+from typing import Any
+from typing import Union
+from typing import Optional
+from collections import OrderedDict
+
+# wbits for each encoding, `deflate` in http means the zlib wrapper
+ENCODINGS = {
+    'gzip': 31,
+    'deflate': 15
+}
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+CACHE_KEY = tuple[Any, ...]
+class Compression:
+    """Negotiates response compression and keeps an lru of compressed bodies"""
+    def __init__(
+        self, level: int = 6,
+        threshold: int = 1024,
+        cache_size: int = 256
+    ) -> None:
+        self.level = level
+        self.threshold = threshold
+        self.cache_size = cache_size
+
+        # key -> (crc32 of the plain body, compressed body)
+        self.cache: OrderedDict[CACHE_KEY, tuple[int, bytes]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        if not (total := self.hits + self.misses):
+            return 0.0
+
+        return self.hits / total
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        accepted = {}
+        for coding in accept_encoding.split(','):
+            name, _, params = coding.strip().partition(';')
+            q = 1.0
+            if params.strip().startswith('q='):
+                try: q = float(params.strip()[2:])
+                except ValueError: q = 0.0
+
+            accepted[name.strip().lower()] = q
+
+        for encoding in ENCODINGS:
+            if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+                return encoding
+
+        return None
+
+    def should_compress(
+        self, body: Union[bytes, bytearray],
+        headers: dict[str, Any]
+    ) -> bool:
+        if len(body) < self.threshold:
+            return False
+
+        content_type = ''
+        for key, value in headers.items():
+            key = key.lower()
+            if key == 'content-encoding':
+                return False
+
+            if key == 'content-type':
+                content_type = str(value)
+
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def compress(
+        self, body: Union[bytes, bytearray],
+        encoding: str, key: CACHE_KEY
+    ) -> bytes:
+        key = (*key, encoding)
+        # the checksum guards against handlers whose output
+        # changes without the data version changing
+        checksum = zlib.crc32(body)
+
+        if (
+            (cached := self.cache.get(key)) and
+            cached[0] == checksum
+        ):
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        compressor = zlib.compressobj(
+            self.level, zlib.DEFLATED, ENCODINGS[encoding]
+        )
+        compressed = compressor.compress(body) + compressor.flush()
+
+        self.cache[key] = (checksum, compressed)
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return compressed
@@ -0,0 +1,108 @@
+from bisect import bisect_left
+
+# upper bounds, in seconds and bytes, anything past the last is `+Inf`
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+SIZE_BUCKETS = (
+    64, 256, 1024, 4096, 16384, 65536,
+    262144, 1048576, 4194304, 16777216
+)
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: tuple) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # `le` is inclusive, which is exactly what bisect_left gives
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+class RouteMetrics:
+    __slots__ = ('in_flight', 'statuses', 'latency', 'size')
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.statuses: dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+
+    def observe(self, code: int, latency: float, size: int) -> None:
+        self.statuses[code] = self.statuses.get(code, 0) + 1
+        self.latency.observe(latency)
+        self.size.observe(size)
+
+class Metrics:
+    """Per route counters and histograms, only ever touched from the
+    event loop so nothing here needs a lock"""
+    def __init__(self) -> None:
+        self.routes: dict[str, RouteMetrics] = {}
+
+    def route(self, route: str) -> RouteMetrics:
+        if (metrics := self.routes.get(route)) is None:
+            metrics = self.routes[route] = RouteMetrics()
+
+        return metrics
+
+    def render(self, gauges: dict[str, tuple[str, float]]) -> bytes:
+        lines = [
+            '# HELP http_requests_total Requests handled, by route and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        labels = {route: f'route="{escape(route)}"' for route in self.routes}
+
+        for route, metrics in self.routes.items():
+            for code, count in metrics.statuses.items():
+                lines.append(
+                    f'http_requests_total{{{labels[route]},code="{code}"}} {count}'
+                )
+
+        lines += [
+            '# HELP http_requests_in_flight Requests currently being handled.',
+            '# TYPE http_requests_in_flight gauge',
+        ]
+        for route, metrics in self.routes.items():
+            lines.append(f'http_requests_in_flight{{{labels[route]}}} {metrics.in_flight}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Time spent handling requests.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for route, metrics in self.routes.items():
+            lines += metrics.latency.lines('http_request_duration_seconds', labels[route])
+
+        lines += [
+            '# HELP http_response_size_bytes Size of response bodies.',
+            '# TYPE http_response_size_bytes histogram',
+        ]
+        for route, metrics in self.routes.items():
+            lines += metrics.size.lines('http_response_size_bytes', labels[route])
+
+        for name, (kind, value) in gauges.items():
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+
+        lines.append('')
+        return '\n'.join(lines).encode()
@@ -0,0 +1,143 @@
+import re
+import tempfile
+from typing import Any
+from typing import Union
+from typing import Optional
+
+# parts bigger than this get spooled to a temporary file on disk
+SPOOL_SIZE = 1024 * 1024
+PART_PARAM = re.compile(r'(?P<key>\w+)="(?P<value>[^"]*)"')
+
+class MultipartFile:
+    def __init__(self, filename: str, content_type: Optional[str]) -> None:
+        self.filename = filename
+        self.content_type = content_type
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+
+    def read(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __repr__(self) -> str:
+        return self.filename
+
+PART = Union[bytearray, MultipartFile]
+class MultipartParser:
+    """Splits a multipart/form-data body into parts as it streams in"""
+    PREAMBLE = 0
+    BOUNDARY = 1
+    HEADERS = 2
+    DATA = 3
+    DONE = 4
+
+    def __init__(self, boundary: str) -> None:
+        self.delimiter = b'\r\n--' + boundary.encode()
+        # lets the first boundary match the same delimiter as the rest
+        self.buffer = bytearray(b'\r\n')
+        self.state = self.PREAMBLE
+
+        self.fields: dict[str, Any] = {}
+        self.files: dict[str, MultipartFile] = {}
+
+        self.name = ''
+        self.part: Optional[PART] = None
+
+    def feed(self, data: Union[bytes, memoryview]) -> None:
+        self.buffer += data
+
+        while self.state != self.DONE and self.step():
+            pass
+
+    def step(self) -> bool:
+        if self.state in (self.PREAMBLE, self.DATA):
+            idx = self.buffer.find(self.delimiter)
+            if idx == -1:
+                # keep enough to match a delimiter split across feeds
+                self.write(len(self.buffer) - len(self.delimiter) + 1)
+                return False
+
+            self.write(idx)
+            self.finish_part()
+            del self.buffer[:len(self.delimiter)]
+            self.state = self.BOUNDARY
+            return True
+
+        if self.state == self.BOUNDARY:
+            if len(self.buffer) < 2:
+                return False
+
+            if self.buffer[:2] == b'--':
+                self.buffer.clear()
+                self.state = self.DONE
+                return False
+
+            if (idx := self.buffer.find(b'\r\n')) == -1:
+                return False
+
+            del self.buffer[:idx + 2]
+            self.state = self.HEADERS
+            return True
+
+        # self.state == self.HEADERS
+        if (idx := self.buffer.find(b'\r\n\r\n')) == -1:
+            return False
+
+        self.start_part(bytes(self.buffer[:idx]).decode(errors='replace'))
+        del self.buffer[:idx + 4]
+        self.state = self.DATA
+        return True
+
+    def start_part(self, encoded_headers: str) -> None:
+        headers = {}
+        for header in encoded_headers.splitlines():
+            if ':' not in header:
+                continue
+
+            k, v = header.split(':', 1)
+            headers[k.strip().lower()] = v.strip()
+
+        params = {
+            m['key']: m['value'] for m in
+            PART_PARAM.finditer(headers.get('content-disposition', ''))
+        }
+
+        self.name = params.get('name', '')
+        if 'filename' in params:
+            self.part = MultipartFile(
+                params['filename'], headers.get('content-type')
+            )
+        else:
+            self.part = bytearray()
+
+    def write(self, length: int) -> None:
+        if length <= 0:
+            return
+
+        if self.state == self.DATA:
+            with memoryview(self.buffer) as view:
+                if isinstance(self.part, MultipartFile):
+                    self.part.file.write(view[:length])
+                else:
+                    self.part += view[:length] # type: ignore
+
+        # preamble is just thrown away
+        del self.buffer[:length]
+
+    def finish_part(self) -> None:
+        if self.state != self.DATA:
+            return
+
+        if isinstance(self.part, MultipartFile):
+            self.files[self.name] = self.part
+        else:
+            self.fields[self.name] = self.part.decode(errors='replace') # type: ignore
+
+        self.part = None
+
+    def close(self) -> dict[str, Any]:
+        # osu! sends fields and files under the same name (`score`),
+        # so a file never replaces a field, it's still in `files` though
+        return self.files | self.fields
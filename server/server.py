@@ -1,12 +1,24 @@
 import re
 import http
+import time
+import signal
 import socket
 import asyncio
+import traceback
+import mimetypes
+import urllib.parse as urlparse
 from typing import Any
+from pathlib import Path
 from typing import Union
+from typing import BinaryIO
 from typing import Callable
 from typing import Optional
-from typing import TypedDict
+from typing import AsyncIterator
+from collections import deque
+from .metrics import Metrics
+from .compression import Compression
+from .multipart import MultipartFile
+from .multipart import MultipartParser
 
 # https://datatracker.ietf.org/doc/html/rfc7231#section-6s
 HTTP_STATUS_CODES = {
@@ -15,29 +27,135 @@ HTTP_STATUS_CODES = {
 	for status in http.HTTPStatus
 }
 
-# TODO: define more types?
+UNMATCHED = '<unmatched>'
+
+class Params:
+    """Query parameters, split and percent-decoded only once they're read"""
+    __slots__ = ('query', '_raw', '_decoded')
+
+    def __init__(self, query: str = '') -> None:
+        self.query = query
+        self._raw: Optional[dict[str, str]] = None
+        self._decoded: Optional[dict[str, str]] = None
+
+    @property
+    def raw(self) -> dict[str, str]:
+        if self._raw is None:
+            self._raw = {}
+            for param in self.query.split('&'):
+                if '=' not in param:
+                    continue
+
+                k, v = param.split('=', 1)
+                self._raw[k] = v
+
+        return self._raw
+
+    def get_raw(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return self.raw.get(key, default)
+
+    def get_str(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        if self._decoded is None:
+            self._decoded = {}
+        elif key in self._decoded:
+            return self._decoded[key]
+
+        if (value := self.raw.get(key)) is None:
+            return default
+
+        self._decoded[key] = value = urlparse.unquote_plus(value)
+        return value
+
+    def get_int(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        if (value := self.get_str(key)) is None:
+            return default
+
+        try: return int(value)
+        except ValueError: return default
+
+    def get_float(self, key: str, default: Optional[float] = None) -> Optional[float]:
+        if (value := self.get_str(key)) is None:
+            return default
+
+        try: return float(value)
+        except ValueError: return default
+
+    def __getitem__(self, key: str) -> str:
+        if (value := self.get_str(key)) is None:
+            raise KeyError(key)
+
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.raw[key] = urlparse.quote_plus(str(value))
+        if self._decoded is None:
+            self._decoded = {}
+
+        self._decoded[key] = str(value)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.raw
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def items(self):
+        return self.raw.items()
+
+    def __repr__(self) -> str:
+        return repr(self.raw)
+
 class Request:
-    def __init__(self) -> None:
-        self.content_length: int
-        self.method: str
-        self.path: str
-        self.params: dict[str, Any]
-        self.http_version: float
-        self.content_type: str
-        self.raw_body: bytes
-        self.boundary: str
-        self.multipart: Optional[dict[str, Any]]
-        self.args: dict[str, Any]
-        self.host: str
+    __slots__ = (
+        'method', 'path', 'params', 'http_version', 'headers',
+        'raw_body', 'boundary', 'multipart', 'files', 'args', 'route',
+        'client'
+    )
+
+    def __init__(
+        self, method: str, path: str, params: Params,
+        http_version: float, headers: dict[str, str]
+    ) -> None:
+        self.method = method
+        self.path = path
+        self.params = params
+        self.http_version = http_version
+        # raw values, see `Request.get_int`/`Request.get_str`
+        self.headers = headers
+        self.raw_body = b''
+        self.boundary: Optional[str] = None
+        self.multipart: Optional[dict[str, Any]] = None
+        self.files: Optional[dict[str, MultipartFile]] = None
+        self.args: Optional[dict[str, Any]] = None
+        self.route = UNMATCHED
+        # address of the connection the request came in on
+        self.client = ''
+
+    def __getattr__(self, name: str) -> str:
+        # headers read like attributes, `request.osu_token`
+        try:
+            return self.headers[name]
+        except KeyError:
+            raise AttributeError(name) from None
     
     def __contains__(self, item: Any) -> bool:
-        return self.__dict__.__contains__(item)
-    
-    @classmethod
-    def from_dict(cls, data: dict[str, Any]) -> 'Request':
-        req = cls()
-        req.__dict__.update(data)
-        return req
+        if item in self.headers:
+            return True
+
+        return item in self.__slots__ and getattr(self, item) is not None
+
+    def get_str(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.headers.get(name, default)
+
+    def get_int(self, name: str, default: Optional[int] = None) -> Optional[int]:
+        if (value := self.headers.get(name)) is None:
+            return default
+
+        try: return int(value)
+        except ValueError: return default
     
     def __repr__(self) -> str:
         return self.path
@@ -61,12 +179,83 @@ class Request:
         else:
             return url
         
-class Route(TypedDict):
-    path: Union[str, re.Pattern]
-    methods: list[str]
-    func: Callable
+# matches named groups and named backreferences in a pattern
+GROUP_NAME = re.compile(r'\(\?P(?P<kind>[<=])(?P<name>[a-zA-Z_][a-zA-Z0-9_]*)')
+
+# value, args and the route (exact path or pattern) that matched
+MATCH = tuple[Any, dict[str, Any], str]
+class Router:
+    """Exact paths resolve through one dict lookup, every pattern
+    is folded into a single alternation compiled once"""
+    def __init__(self) -> None:
+        self.static: dict[str, Any] = {}
+        self.patterns: list[tuple[re.Pattern, Any]] = []
+        self.branches: dict[str, tuple[Any, tuple[tuple[str, str], ...], str]] = {}
+        self.compiled: Optional[re.Pattern] = None
+        self.dirty = False
+
+    @classmethod
+    def from_dict(cls, routes: dict[Union[str, re.Pattern], Any]) -> 'Router':
+        router = cls()
+        for path, value in routes.items():
+            router.add(path, value)
+
+        router.compile()
+        return router
+
+    def add(self, path: Union[str, re.Pattern], value: Any) -> None:
+        if isinstance(path, str):
+            self.static[path] = value
+        else:
+            self.patterns.append((path, value))
+            self.dirty = True
+
+    def compile(self) -> None:
+        alternatives = []
+        self.branches = {}
 
+        for idx, (pattern, value) in enumerate(self.patterns):
+            # group names have to be unique across the whole alternation
+            prefix = f'_{idx}_'
+            source = GROUP_NAME.sub(
+                lambda m: f"(?P{m['kind']}{prefix}{m['name']}",
+                pattern.pattern
+            )
+            alternatives.append(f'(?P<_{idx}>{source})')
+            self.branches[f'_{idx}'] = (value, tuple(
+                (f'{prefix}{name}', name) for name in pattern.groupindex
+            ), pattern.pattern)
+
+        self.compiled = re.compile('|'.join(alternatives)) if alternatives else None
+        self.dirty = False
+
+    def match(self, path: str) -> Optional[MATCH]:
+        if path in self.static:
+            return self.static[path], {}, path
+
+        if self.dirty:
+            self.compile()
+
+        if (
+            not self.compiled or
+            not (m := self.compiled.match(path))
+        ):
+            return None
+
+        # the branch wrapper closes last, so it's always `lastgroup`
+        value, groups, route = self.branches[m.lastgroup] # type: ignore
+        return value, {name: m[group] for group, name in groups}, route
+
+CONNECTION = {
+    None: b'\r\n',
+    True: b'Connection: keep-alive\r\n\r\n',
+    False: b'Connection: close\r\n\r\n'
+}
+
+BUFFERS = tuple[Union[bytes, bytearray], ...]
 class Response:
+    __slots__ = ('code', 'body', 'headers')
+
     def __init__(
         self, code: int, body: Union[bytes, bytearray], 
         headers: dict[str, Any] = {}
@@ -75,155 +264,830 @@ class Response:
         self.body = body
         self.headers = headers
 
-    def to_bytes(self) -> bytes:        
-        resp = bytearray((
+    @property
+    def content_length(self) -> int:
+        return len(self.body)
+
+    def head(self, keep_alive: Optional[bool] = None) -> bytes:
+        head = [
             f'HTTP/1.1 {self.code} {HTTP_STATUS_CODES[self.code]}\r\n'
-            f'Content-Length: {len(self.body)}\r\n'
-        ).encode())
+            f'Content-Length: {self.content_length}\r\n'
+        ]
 
         for key, value in self.headers.items():
-            resp += f'{key}: {value}\r\n'.encode()
+            head.append(f'{key}: {value}\r\n')
+
+        return ''.join(head).encode() + CONNECTION[keep_alive]
+
+    def buffers(self, keep_alive: Optional[bool] = None) -> BUFFERS:
+        # body is kept as its own buffer so it never gets copied
+        return (self.head(keep_alive), self.body)
+
+    def to_bytes(self) -> bytes:
+        return b''.join(self.buffers())
+
+class StaticResponse(Response):
+    """Response that never changes, its wire bytes are encoded once"""
+    __slots__ = ('wire',)
+
+    def __init__(
+        self, code: int, body: Union[bytes, bytearray], 
+        headers: dict[str, Any] = {}
+    ) -> None:
+        super().__init__(code, bytes(body), headers)
+        self.wire = {
+            keep_alive: self.head(keep_alive) + self.body
+            for keep_alive in CONNECTION
+        }
+
+    def buffers(self, keep_alive: Optional[bool] = None) -> BUFFERS:
+        return (self.wire[keep_alive],)
+
+RANGE = re.compile(r'bytes=(?P<start>[0-9]*)-(?P<end>[0-9]*)$')
+class FileResponse(Response):
+    """Response streamed straight from a file on disk with sendfile"""
+    __slots__ = ('path', 'size', 'offset', 'count')
+
+    def __init__(
+        self, path: Union[str, Path], code: int = 200,
+        headers: dict[str, Any] = {}
+    ) -> None:
+        super().__init__(code, b'', headers)
+        self.path = Path(path)
+        self.size = self.path.stat().st_size
+        self.offset = 0
+        self.count = self.size
+
+        self.headers = {'Accept-Ranges': 'bytes'} | self.headers
+        if (content_type := mimetypes.guess_type(self.path.name)[0]):
+            self.headers = {'Content-Type': content_type} | self.headers
+
+    @property
+    def content_length(self) -> int:
+        return self.count
+
+    def prepare(self, request: Request) -> None:
+        # only single ranges are served, anything else gets the whole file
+        if (
+            'range' not in request or
+            not (m := RANGE.match(request.range.strip()))
+        ):
+            return
+
+        start, end = m['start'], m['end']
+        if not start and not end:
+            return
+
+        if not start: # suffix range, the last `end` bytes
+            first = max(self.size - int(end), 0)
+            last = self.size - 1
+        else:
+            first = int(start)
+            last = min(int(end), self.size - 1) if end else self.size - 1
+
+        if first >= self.size or first > last:
+            self.code = 416
+            self.count = 0
+            self.headers = self.headers | {'Content-Range': f'bytes */{self.size}'}
+            return
+
+        self.code = 206
+        self.offset = first
+        self.count = last - first + 1
+        self.headers = self.headers | {
+            'Content-Range': f'bytes {first}-{last}/{self.size}'
+        }
+
+    def buffers(self, keep_alive: Optional[bool] = None) -> BUFFERS:
+        return (self.head(keep_alive),)
+
+class RequeueResponse(Response):
+    """Response whose body was taken out of a queue, `requeue` gives
+    it back when the client is gone before it could be written"""
+    __slots__ = ('requeue',)
+
+    def __init__(
+        self, code: int, body: Union[bytes, bytearray],
+        requeue: Callable[[], None], headers: dict[str, Any] = {}
+    ) -> None:
+        super().__init__(code, body, headers)
+        self.requeue = requeue
+
+def requeue(resp: 'RESPONSE') -> None:
+    if isinstance(resp, RequeueResponse):
+        resp.requeue()
+
+def peer_closed(client: socket.socket) -> bool:
+    """Whether the client hung up, without reading anything off the socket"""
+    try:
+        return not client.recv(1, socket.MSG_PEEK)
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError:
+        return True
+
+NOT_FOUND = StaticResponse(404, b'')
+SERVICE_UNAVAILABLE = StaticResponse(503, b'')
+BAD_REQUEST = StaticResponse(400, b'')
+PAYLOAD_TOO_LARGE = StaticResponse(413, b'')
+INTERNAL_SERVER_ERROR = StaticResponse(500, b'')
+RESPONSE = Union[Response, bytes, bytearray]
+
+async def send_buffers(
+    client: socket.socket,
+    loop: asyncio.AbstractEventLoop,
+    buffers: BUFFERS
+) -> None:
+    if len(buffers) == 1:
+        await loop.sock_sendall(client, buffers[0])
+        return
+
+    sent = 0
+    if hasattr(client, 'sendmsg'): # not on windows
+        try:
+            sent = client.sendmsg(buffers)
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    # whatever the kernel didn't take in one go
+    for buffer in buffers:
+        if sent >= len(buffer):
+            sent -= len(buffer)
+            continue
+
+        await loop.sock_sendall(client, memoryview(buffer)[sent:])
+        sent = 0
+
+# sendfile isn't always there, uvloop's loop doesn't implement it at all
+SENDFILE_ERRORS = (NotImplementedError, asyncio.SendfileNotAvailableError)
+FILE_CHUNK_SIZE = 256 * 1024
+
+async def read_chunks(
+    f: BinaryIO, offset: int, count: int
+) -> AsyncIterator[bytes]:
+    """A file's range read off the event loop, for when sendfile can't be used"""
+    loop = asyncio.get_running_loop()
+    f.seek(offset)
+    while count > 0:
+        chunk = await loop.run_in_executor(
+            None, f.read, min(FILE_CHUNK_SIZE, count)
+        )
+        if not chunk:
+            # the headers promised more, the connection can't be reused
+            raise ConnectionError('file shrank while being sent')
+
+        count -= len(chunk)
+        yield chunk
+
+async def send_response(
+    client: socket.socket,
+    loop: asyncio.AbstractEventLoop,
+    resp: RESPONSE, keep_alive: bool
+) -> None:
+    if not isinstance(resp, Response):
+        await loop.sock_sendall(client, resp)
+        return
+
+    await send_buffers(client, loop, resp.buffers(keep_alive))
+    if isinstance(resp, FileResponse) and resp.count:
+        with resp.path.open('rb') as f:
+            try:
+                await loop.sock_sendfile(client, f, resp.offset, resp.count)
+                return
+            except SENDFILE_ERRORS:
+                pass
+
+            async for chunk in read_chunks(f, resp.offset, resp.count):
+                await loop.sock_sendall(client, chunk)
+
+RECV_SIZE = 65536
+MAX_HEADER_SIZE = 65536
+
+# these repeat on every request, so they're normalised once and shared
+METHODS = {m: m for m in ('GET', 'POST', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')}
+HTTP_VERSIONS = {'HTTP/1.1': 1.1, 'HTTP/1.0': 1.0}
+HEADER_NAMES: dict[str, str] = {}
+MAX_HEADER_NAMES = 256
+
+class BodyTooLarge(ValueError):
+    pass
+
+class RequestParser:
+    """Incremental request parser, fed bytes as they come off the socket"""
+    HEADERS = 0
+    BODY = 1
+
+    def __init__(self, server: 'Server', client: str = '') -> None:
+        self.server = server
+        self.client = client
+        self.buffer = bytearray()
+        self.state = self.HEADERS
+        self.request: Optional[Request] = None
+        self.multipart: Optional[MultipartParser] = None
+        self.content_length = 0
+        self.scanned = 0
+        # set once the stream stops making sense, nothing after it is parsed
+        self.error: Optional[StaticResponse] = None
+
+    @property
+    def phase(self) -> str:
+        if self.state == self.BODY:
+            return 'body'
+
+        return 'headers' if self.buffer else 'idle'
+
+    def feed(self, data: bytes) -> list[Request]:
+        if self.error:
+            return []
+
+        self.buffer += data
+        requests = []
+        try:
+            while (request := self.next_request()) is not None:
+                requests.append(request)
+        except ValueError as e:
+            # where the next request starts can't be known anymore, the
+            # requests before this one get answered, then the error
+            self.error = (
+                PAYLOAD_TOO_LARGE if isinstance(e, BodyTooLarge)
+                else BAD_REQUEST
+            )
+            # the traceback can still hold a view of the old one
+            self.buffer = bytearray()
+
+        return requests
+
+    def next_request(self) -> Optional[Request]:
+        if self.state == self.HEADERS:
+            # clients may send a stray CRLF after a body
+            while not self.scanned and self.buffer[:2] == b'\r\n':
+                del self.buffer[:2]
+
+            # only rescan the last 3 bytes of what was already searched
+            idx = self.buffer.find(b'\r\n\r\n', max(self.scanned - 3, 0))
+            if idx == -1:
+                self.scanned = len(self.buffer)
+                if self.scanned > MAX_HEADER_SIZE:
+                    raise ValueError('request headers too large')
+
+                return None
+
+            # decoded straight out of the connection's buffer, no copy
+            with memoryview(self.buffer) as view:
+                self.request = self.server.parse_headers(view[:idx])
+
+            self.request.client = self.client
+            del self.buffer[:idx + 4]
+            self.scanned = 0
+
+            # a body that isn't framed exactly would be read as the next request
+            if 'transfer_encoding' in self.request.headers:
+                raise ValueError('transfer encodings are not supported')
+
+            length = self.request.headers.get('content_length', '0')
+            if not (length.isascii() and length.isdigit()):
+                raise ValueError(f'invalid content length {length!r}')
+
+            self.content_length = int(length)
+            if self.content_length > self.server.max_body_size:
+                raise BodyTooLarge(f'body of {length} bytes is too large')
+
+            if (boundary := self.server.parse_boundary(self.request)):
+                self.multipart = MultipartParser(boundary)
+
+            self.state = self.BODY
+
+        if self.multipart:
+            return self.next_multipart()
+
+        if len(self.buffer) < self.content_length:
+            return None
+
+        body = bytes(self.buffer[:self.content_length])
+        del self.buffer[:self.content_length]
+
+        request = self.server.parse_body(self.request, body) # type: ignore
+        self.request = None
+        self.state = self.HEADERS
+        return request
+
+    def next_multipart(self) -> Optional[Request]:
+        # parts are streamed out of the buffer, the body is never kept whole
+        if (length := min(len(self.buffer), self.content_length)):
+            with memoryview(self.buffer) as view:
+                self.multipart.feed(view[:length]) # type: ignore
+
+            del self.buffer[:length]
+            self.content_length -= length
+
+        if self.content_length:
+            return None
+
+        request: Request = self.request # type: ignore
+        request.multipart = self.multipart.close() # type: ignore
+        request.files = self.multipart.files # type: ignore
+        request.raw_body = b''
+
+        self.request = self.multipart = None
+        self.state = self.HEADERS
+        return request
+
+class HTTPProtocol(asyncio.Protocol):
+    """Transport based alternative to `Server.handle_con`"""
+    def __init__(self, server: 'Server') -> None:
+        self.server = server
+        self.parser = RequestParser(server)
+        self.transport: Optional[asyncio.Transport] = None
+        self.pending: deque[Request] = deque()
+        self.task: Optional[asyncio.Task] = None
+        self.admission: Optional[asyncio.Task] = None
+        self.drained: Optional[asyncio.Future] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.phase: Optional[str] = None
+        self.admitted = False
+        self.paused = False
+        self.closed = False
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport # type: ignore
+        if (peer := transport.get_extra_info('peername')):
+            self.parser.client = peer[0]
+
+        if not self.server.can_queue():
+            transport.write(SERVICE_UNAVAILABLE.wire[False]) # type: ignore
+            transport.close()
+            return
+
+        # nothing is read until there's a free connection slot, the
+        # loop only keeps a weak reference to the task
+        transport.pause_reading() # type: ignore
+        self.admission = asyncio.create_task(self.admit())
+
+    async def admit(self) -> None:
+        await self.server.acquire()
+        self.admitted = True
+        self.admission = None
+
+        if self.closed:
+            self.server.release()
+            return
+
+        self.transport.resume_reading() # type: ignore
+        self.arm_timer()
+
+    def arm_timer(self) -> None:
+        # a phase's deadline starts when it's entered, slow
+        # trickling bytes can't push it back
+        if self.phase == (phase := self.parser.phase):
+            return
+
+        self.phase = phase
+        if self.timer:
+            self.timer.cancel()
+
+        self.timer = asyncio.get_running_loop().call_later(
+            self.server.timeouts[phase], self.timed_out
+        )
+
+    def disarm_timer(self) -> None:
+        if self.timer:
+            self.timer.cancel()
+
+        self.timer = self.phase = None
+
+    def timed_out(self) -> None:
+        self.server.timed_out += 1
+        self.transport.close() # type: ignore
+
+    def data_received(self, data: bytes) -> None:
+        self.pending.extend(self.parser.feed(data))
+
+        # nothing more is read while requests are being answered, so a
+        # client can't pipeline requests (or bytes) faster than that, a
+        # lone request doesn't pay for pausing
+        if self.task or len(self.pending) > 1 or self.parser.error:
+            self.paused = True
+            self.transport.pause_reading() # type: ignore
+
+        # one task per connection keeps pipelined responses in order
+        if (self.pending or self.parser.error) and not self.task:
+            self.disarm_timer()
+            self.task = asyncio.create_task(self.process())
+        elif not self.task:
+            self.arm_timer()
+
+    async def process(self) -> None:
+        try:
+            while self.pending and not self.closed:
+                resp, keep_alive = await self.server.respond(
+                    self.pending.popleft()
+                )
+                # the client can leave while a handler waits (long polls)
+                if self.closed:
+                    requeue(resp)
+                    return
+
+                try:
+                    await asyncio.wait_for(
+                        self.write(resp, keep_alive),
+                        self.server.timeouts['write']
+                    )
+                except BaseException:
+                    requeue(resp)
+                    raise
+
+                if not keep_alive:
+                    self.transport.close() # type: ignore
+                    return
+
+            if self.parser.error and not self.closed:
+                await asyncio.wait_for(
+                    self.write(self.parser.error, False),
+                    self.server.timeouts['write']
+                )
+                self.transport.close() # type: ignore
+        except asyncio.TimeoutError:
+            self.timed_out()
+        except Exception:
+            # the connection is closed rather than left open without a deadline
+            traceback.print_exc()
+            self.transport.close() # type: ignore
+        finally:
+            self.task = None
+
+        if not self.closed and not self.transport.is_closing(): # type: ignore
+            if self.paused:
+                self.paused = False
+                self.transport.resume_reading() # type: ignore
+
+            self.arm_timer()
+
+    async def write(self, resp: RESPONSE, keep_alive: bool) -> None:
+        if not isinstance(resp, Response):
+            self.transport.write(resp) # type: ignore
+        else:
+            self.transport.writelines(resp.buffers(keep_alive)) # type: ignore
+            if isinstance(resp, FileResponse) and resp.count:
+                await self.write_file(resp)
+
+        if self.drained:
+            await self.drained
+
+    async def write_file(self, resp: 'FileResponse') -> None:
+        with resp.path.open('rb') as f:
+            try:
+                await asyncio.get_running_loop().sendfile(
+                    self.transport, f, resp.offset, resp.count # type: ignore
+                )
+                return
+            except SENDFILE_ERRORS:
+                pass
+
+            async for chunk in read_chunks(f, resp.offset, resp.count):
+                if self.closed:
+                    return
+
+                self.transport.write(chunk) # type: ignore
+                if self.drained:
+                    await self.drained
+
+    def pause_writing(self) -> None:
+        self.drained = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self) -> None:
+        if self.drained and not self.drained.done():
+            self.drained.set_result(None)
+
+        self.drained = None
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.closed = True
+        self.pending.clear()
+        self.disarm_timer()
+        self.resume_writing()
+
+        if self.admitted:
+            self.admitted = False
+            self.server.release()
 
-        resp += b'\r\n'
-        
-        return bytes(resp + self.body)
-    
 class Server:
-    def __init__(self) -> None:
-        self.routes: list[Route] = []
+    def __init__(
+        self, compression_level: int = 6,
+        compression_threshold: int = 1024,
+        compression_cache_size: int = 256,
+        max_connections: int = 256,
+        max_queued: int = 1024,
+        keep_alive_timeout: float = 15.0,
+        header_timeout: float = 10.0,
+        body_timeout: float = 30.0,
+        write_timeout: float = 30.0,
+        max_body_size: int = 64 * 1024 * 1024,
+        metrics_path: Optional[str] = '/metrics'
+    ) -> None:
+        self.routers: dict[str, Router] = {}
+        self.metrics = Metrics()
+        self.metrics_path = metrics_path
+
+        # connections past `max_connections` wait for a slot,
+        # past `max_queued` waiting they're turned away
+        self.max_connections = max_connections
+        self.max_queued = max_queued
+        self.connections: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # bodies are buffered whole (multipart ones in their parts)
+        self.max_body_size = max_body_size
+
+        self.timeouts = {
+            'idle': keep_alive_timeout,
+            'headers': header_timeout,
+            'body': body_timeout,
+            'write': write_timeout
+        }
+        self.compression = Compression(
+            level = compression_level,
+            threshold = compression_threshold,
+            cache_size = compression_cache_size
+        )
+
+        # bumped by the app whenever the data behind its responses
+        # changes, keys the compressed response cache
+        self.data_version: Callable[[], Any] = lambda: 0
+
+        # extra gauges/counters for /metrics, as name: (type, value)
+        self.gauges: Callable[[], dict[str, tuple[str, float]]] = lambda: {}
     
-    def get(self, path: Union[str, re.Pattern]) -> Callable:
+    def route(
+        self, path: Union[str, re.Pattern],
+        methods: list[str] = ['GET']
+    ) -> Callable:
         def inner(func: Callable) -> Callable:
-            self.routes.append({
-                'path': path,
-                'methods': ['GET'],
-                'func': func
-            })
+            for method in methods:
+                if method not in self.routers:
+                    self.routers[method] = Router()
+
+                self.routers[method].add(path, func)
             return func
         return inner
 
-    def real_type(self, value: str) -> Any:
-        if value.replace('-', '', 1).isdecimal():
-            return int(value)
-        
-        try: return float(value)
-        except: pass
+    def get(self, path: Union[str, re.Pattern]) -> Callable:
+        return self.route(path, ['GET'])
 
-        return value
+    def post(self, path: Union[str, re.Pattern]) -> Callable:
+        return self.route(path, ['POST'])
 
-    def parse_path(self, path: str) -> tuple[str, dict[str, Any]]:
-        params = {}
-        if '?' in path:
-            split = path.split('?', 1)
-            if len(split) == 2:
-                path, _params = split
-                for param in _params.split('&'):
-                    if '=' not in param:
-                        continue
-                    
-                    k, v = param.split('=', 1)
-                    params[k] = self.real_type(v)
-        
-        return (path, params)
+    def parse_path(self, path: str) -> tuple[str, Params]:
+        path, _, query = path.partition('?')
+        return (path, Params(query))
+
+    def parse_headers(self, encoded_headers: Union[bytes, memoryview]) -> Request:
+        request_line, *lines = str(encoded_headers, 'utf-8').split('\r\n')
+        m, p, version = request_line.split(' ')
+        if not (http_version := HTTP_VERSIONS.get(version)):
+            raise ValueError(f'unsupported http version {version!r}')
+
+        path, params = self.parse_path(p)
 
-    def parse_headers(self, encoded_headers: bytes) -> dict[str, Any]:
         headers = {}
-        for idx, header in enumerate(encoded_headers.decode().splitlines()):
-            if idx == 0:
-                m, p, v = header.split()
-                headers['method'] = m
-                headers['path'], headers['params'] = self.parse_path(p)
-                headers['http_version'] = float(v.replace('HTTP/', ''))
-                continue
-            
-            k, v = header.split(': ', 1)
-            headers[k.lower().replace('-', '_')] = self.real_type(v)
+        for header in lines:
+            k, sep, v = header.partition(':')
+            if not sep or not k or k != k.strip():
+                raise ValueError(f'malformed header line {header!r}')
+
+            if (name := HEADER_NAMES.get(k)) is None:
+                name = k.lower().replace('-', '_')
+                if len(HEADER_NAMES) < MAX_HEADER_NAMES:
+                    HEADER_NAMES[k] = name
+
+            # two lengths could each frame the body differently
+            if name == 'content_length' and name in headers:
+                raise ValueError('repeated content length')
+
+            headers[name] = v.strip()
     
-        return headers
+        return Request(
+            method = METHODS.get(m, m), path = path, params = params,
+            http_version = http_version, headers = headers
+        )
+
+    def parse_boundary(self, request: Request) -> Optional[str]:
+        if (
+            'content_type' not in request or
+            not request.content_type.startswith('multipart/form-data')
+        ):
+            return None
+
+        for param in request.content_type.split(';')[1:]:
+            k, _, v = param.strip().partition('=')
+            if k.lower() == 'boundary' and v:
+                request.boundary = '--' + v.strip('"')
+                return v.strip('"')
+
+        return None
 
     def parse_body(self, request: Request, body: bytes) -> Request:
+        request.raw_body = body
+        return request
+
+    def keep_alive(self, request: Request) -> bool:
+        connection = request.get_str('connection', '').lower() # type: ignore
+        if request.http_version >= 1.1:
+            return connection != 'close'
+
+        return connection == 'keep-alive'
+
+    def compress(self, request: Request, resp: Response) -> Response:
+        if (
+            'accept_encoding' not in request or
+            not self.compression.should_compress(resp.body, resp.headers) or
+            not (encoding := self.compression.negotiate(request.accept_encoding))
+        ):
+            return resp
+
+        key = (
+            request.method, request.path,
+            tuple(sorted(request.params.items())),
+            self.data_version()
+        )
+        return Response(
+            code = resp.code,
+            body = self.compression.compress(resp.body, encoding, key),
+            headers = resp.headers | {
+                'Content-Encoding': encoding,
+                'Vary': 'Accept-Encoding'
+            }
+        )
+
+    def render_metrics(self) -> Response:
+        return Response(
+            code = 200,
+            body = self.metrics.render({
+                'http_connections_active': ('gauge', self.active),
+                'http_connections_waiting': ('gauge', self.waiting),
+                'http_connections_rejected_total': ('counter', self.rejected),
+                'http_connections_timed_out_total': ('counter', self.timed_out),
+                'http_compression_cache_hits_total': ('counter', self.compression.hits),
+                'http_compression_cache_misses_total': ('counter', self.compression.misses),
+            } | self.gauges()),
+            headers = {'Content-Type': 'text/plain; version=0.0.4'}
+        )
+
+    async def respond(self, request: Request) -> tuple[RESPONSE, bool]:
+        keep_alive = self.keep_alive(request)
+        if request.path == self.metrics_path:
+            return self.render_metrics(), keep_alive
+
+        # in flight is counted against the outer route, a handler can
+        # narrow `request.route` down (see main.osu) before it's recorded
+        in_flight = None
+        start = time.perf_counter()
+        resp = None
+        try:
+            if (
+                (router := self.routers.get(request.method)) and
+                (match := router.match(request.path))
+            ):
+                func, request.args, request.route = match
+                in_flight = self.metrics.route(request.route)
+                in_flight.in_flight += 1
+                resp = await func(request)
+            else:
+                print(request.path, request.params, request.method)
+        except Exception:
+            traceback.print_exc()
+            resp = INTERNAL_SERVER_ERROR
+        finally:
+            if in_flight:
+                in_flight.in_flight -= 1
+
+            if request.files:
+                for file in request.files.values():
+                    file.close()
+
+        if resp is None:
+            resp = NOT_FOUND
+
         if (
-            'content_type' in request and
-            request.method == 'POST'
+            isinstance(resp, Response) and
+            not isinstance(resp, (StaticResponse, FileResponse, RequeueResponse))
         ):
-            request.boundary = '--' + request.content_type.split('; boundary=', 1)[1]
-            request.multipart = None
-            breakpoint() # TODO: multipart
+            resp = self.compress(request, resp)
+
+        if isinstance(resp, FileResponse):
+            resp.prepare(request)
+
+        if not isinstance(resp, (Response, bytes, bytearray)):
+            raise Exception(f'unknown type for resp, type: {type(resp)}')
+
+        # recorded as sent, after ranges and compression are applied
+        if isinstance(resp, Response):
+            code, size = resp.code, resp.content_length
         else:
-            request.raw_body = body
-        
-        return request
+            code, size = 200, len(resp)
 
-    def parse(self, content: bytes) -> Request:
-        request = {}
-        split = content.split(b'\r\n\r\n', 1)
-        len_split = len(split)
+        self.metrics.route(request.route).observe(
+            code, time.perf_counter() - start, size
+        )
+        return resp, keep_alive
 
-        if len_split == 0:
-            return Request()
-        if len_split == 1:
-            request |= self.parse_headers(split[0])
-            return Request.from_dict(request)
-        
-        headers, body = split
-        request |= self.parse_headers(headers)
-        request = self.parse_body(Request.from_dict(request), body)
+    def can_queue(self) -> bool:
+        """Counts a new connection as waiting right away, so a burst
+        of accepts can't all get in before any of them waits"""
+        if self.active + self.waiting < self.max_connections + self.max_queued:
+            self.waiting += 1
+            return True
 
-        return request
+        self.rejected += 1
+        return False
+
+    async def acquire(self) -> None:
+        """Takes a slot for a connection `can_queue` let in"""
+        try:
+            await self.connections.acquire() # type: ignore
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self.connections.release() # type: ignore
 
     async def handle_con(
         self, client: socket.socket,
         loop: asyncio.AbstractEventLoop
     ) -> None:
-        data = await loop.sock_recv(client, 1024)
-        if not data:
-            await loop.sock_sendall(client, b'')
+        try:
+            await self.acquire()
+        except asyncio.CancelledError:
             client.close()
-            return
-        
-        request = self.parse(data)
-        if 'content_length' in request:
-            length = request.content_length
-            if length > 1024:
-                data += await loop.sock_recv(client, length)
-                request = self.parse(data)
-        
-        for route in self.routes:
-            if request.method not in route['methods']:
-                continue
+            raise
 
-            path = route['path']
-            if isinstance(path, str):
-                if request.path != path:
-                    continue
-            else:
-                result = path.match(request.path)
-                if not result:
-                    continue
-                
-                request.args = result.groupdict()
+        try: peer = client.getpeername()[0]
+        except OSError: peer = ''
 
-            resp = await route['func'](request)
+        parser = RequestParser(self, peer)
+        phase = None
+        deadline = 0.0
+        try:
+            while True:
+                # a phase's deadline starts when it's entered, slow
+                # trickling bytes can't push it back
+                if parser.phase != phase:
+                    phase = parser.phase
+                    deadline = loop.time() + self.timeouts[phase]
 
-            if isinstance(resp, Response):
-                await loop.sock_sendall(client, resp.to_bytes())
-            elif isinstance(resp, bytearray):
-                await loop.sock_sendall(client, bytes(resp))
-            elif isinstance(resp, bytes):
-                await loop.sock_sendall(client, resp)
-            else:
-                raise Exception(f'unknown type for resp, type: {type(resp)}')
-            
-            client.close()
-            return
+                data = await asyncio.wait_for(
+                    loop.sock_recv(client, RECV_SIZE),
+                    max(deadline - loop.time(), 0)
+                )
+                if not data:
+                    return
+
+                for request in parser.feed(data):
+                    resp, keep_alive = await self.respond(request)
+                    # the client can leave while a handler waits (long
+                    # polls), sending would still succeed
+                    if isinstance(resp, RequeueResponse) and peer_closed(client):
+                        resp.requeue()
+                        return
+
+                    try:
+                        await asyncio.wait_for(
+                            send_response(client, loop, resp, keep_alive),
+                            self.timeouts['write']
+                        )
+                    except BaseException:
+                        requeue(resp)
+                        raise
 
-        print(request.path, request.params, request.method)
+                    if not keep_alive:
+                        return
+
+                    phase = None
+
+                if parser.error:
+                    await asyncio.wait_for(
+                        send_response(client, loop, parser.error, False),
+                        self.timeouts['write']
+                    )
+                    return
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            client.close()
+            self.release()
 
     async def _run(
         self, bind: tuple[str, int], 
         listening: int, 
         before_startup: Optional[Callable],
-        background_tasks: Optional[list[Callable]]
+        background_tasks: Optional[list[Callable]],
+        use_protocol: bool = False
     ) -> None:
         
         with socket.socket(socket.AF_INET) as sock:
@@ -235,6 +1099,11 @@ class Server:
             if background_tasks:
                 [asyncio.create_task(func()) for func in background_tasks]
 
+            for router in self.routers.values():
+                router.compile()
+
+            self.connections = asyncio.Semaphore(self.max_connections)
+
             sock.bind(bind)
             sock.listen(listening)
             sock.setblocking(False)
@@ -243,9 +1112,26 @@ class Server:
                 f'Server is up and running on port {bind[1]}!'
             )
 
+            if use_protocol:
+                server = await loop.create_server(
+                    lambda: HTTPProtocol(self),
+                    sock = sock, backlog = listening
+                )
+                async with server:
+                    await server.serve_forever()
+
+                return
+
             try:
                 while True:
                     client, addr = await loop.sock_accept(sock)
+                    if not self.can_queue():
+                        try: client.send(SERVICE_UNAVAILABLE.wire[False])
+                        except OSError: pass
+
+                        client.close()
+                        continue
+
                     loop.create_task(self.handle_con(client, loop))
             except KeyboardInterrupt:
                 return
@@ -254,11 +1140,23 @@ class Server:
         self, bind: tuple[str, int], 
         listening: int = 5, 
         before_startup: Optional[Callable] = None,
-        background_tasks: Optional[list[Callable]] = None
+        background_tasks: Optional[list[Callable]] = None,
+        use_protocol: bool = False,
+        after_shutdown: Optional[Callable] = None
     ) -> None:
-        asyncio.run(self._run(
-            bind = bind,
-            listening = listening,
-            before_startup = before_startup,
-            background_tasks = background_tasks
-        ))
\ No newline at end of file
+        # so a SIGTERM unwinds like ctrl+c and `after_shutdown` still
+        # runs, only possible when running on the main thread
+        try: signal.signal(signal.SIGTERM, signal.default_int_handler)
+        except ValueError: pass
+
+        try:
+            asyncio.run(self._run(
+                bind = bind,
+                listening = listening,
+                before_startup = before_startup,
+                background_tasks = background_tasks,
+                use_protocol = use_protocol
+            ))
+        finally:
+            if after_shutdown:
+                after_shutdown()
@@ -8,6 +8,7 @@ from colorama import Fore
 from typing import Literal
 from typing import Callable
 from typing import TYPE_CHECKING
+from concurrent.futures import Future
 
 if TYPE_CHECKING:
     from objects import Score
@@ -73,21 +74,50 @@ def is_path(p: str) -> Union[Path, Literal[False]]:
     else:
         return False
 
-def update_files() -> None:
-    glob.pfps.update_file()
-    glob.beatmaps.update_file()
-    glob.profiles.update_file()
-    glob.modified_beatmaps.update_file()
+def flush_files() -> Future:
+    """Starts writing every changed file now, the future's done once
+    they're on disk for when a change can't wait for the next flush"""
+    if glob.flush_timer:
+        glob.flush_timer.cancel()
+        glob.flush_timer = None
+
+    for file in (
+        glob.pfps, glob.beatmaps,
+        glob.profiles, glob.modified_beatmaps
+    ):
+        if file.dirty:
+            file.update_file()
+
+    return glob.writer.sync()
+
+def files_changed() -> None:
+    """Flushes in `glob.flush_interval` seconds, so
+    everything changed until then is written at once"""
+    glob.data_version += 1
+    if glob.flush_timer:
+        return
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush_files()
+        return
+
+    glob.flush_timer = loop.call_later(glob.flush_interval, flush_files)
+
+# packets queued before anyone logged in are kept up to this many bytes
+MAX_PENDING_PACKETS = 64 * 1024
+def add_to_player_queue(packets: bytes) -> None:
+    """Safe way to add to every player's queue"""
+    if glob.sessions:
+        for p in glob.sessions:
+            p.queue += packets
 
-async def _add_to_player_queue(packets: bytes) -> None:
-    while not glob.player:
-        await asyncio.sleep(1)
-    
-    glob.player.queue += packets
+        return
 
-def add_to_player_queue(packets: bytes) -> None:
-    """Safe way to add to a player's queue"""
-    asyncio.create_task(_add_to_player_queue(packets))
+    # every player logging in gets these, see `cho.login`
+    if len(glob.pending_packets) + len(packets) <= MAX_PENDING_PACKETS:
+        glob.pending_packets += packets
 
 def filter_top_scores(_scores: list[dict]) -> list[dict]:
     """Removes duplicated scores"""